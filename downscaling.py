@@ -5,8 +5,10 @@ import signal
 import time
 from threading import Thread
 
-from lib.logger import configure_logging
+from lib.logger import configure_logging, close_logs
 from lib.util import parse_options
+from lib.sshpool import get_pool
+from lib.retry import get_retry_policy, get_breakers
 from lib.config import Config
 from resources.clouds import Clouds
 from resources.master import Master
@@ -14,6 +16,7 @@ from resources.workload import Workload
 from resources.initialmonitor import InitialMonitor
 from resources.policy import Policy
 from resources.phantom import PhantomClient
+from resources.condor import CondorPoller
 
 SIGEXIT = False
 LOG = logging.getLogger(__name__)
@@ -37,22 +40,27 @@ class Downscaling(Thread):
         self.master = Master(self.config, self.clouds)
         self.clouds = Clouds(self.config)
 
+        # Single source of Condor state (job queue, pool status) for all threads
+        self.condor_poller = CondorPoller(self.config, self.master.dns, self.config.globals.condor_poll_interval)
+        self.condor_poller.start()
+
         self.phantom_client = PhantomClient(self.config, self.master)
         self.phantom_client.connect()
         self.phantom_client.create_launch_configs()
         self.phantom_client.create_auto_scaling_group()
 
         # Wait until all workers register with master (as Idle resources)
-        self.initialmonitor = InitialMonitor(self.config, self.master, self.phantom_client.asg.desired_capacity)
+        self.initialmonitor = InitialMonitor(self.config, self.master, self.phantom_client.asg.desired_capacity,
+                                             poller=self.condor_poller)
         self.initialmonitor.start()
         self.initialmonitor.join()
 
         # Launch workload submission thread
-        self.workload = Workload(self.config, self.master)
+        self.workload = Workload(self.config, self.master, poller=self.condor_poller)
         self.workload.start()
 
         # Start downscaling policy
-        self.policy = Policy(self.config, self.master, self.phantom_client)
+        self.policy = Policy(self.config, self.master, self.phantom_client, self.condor_poller)
         self.policy.start()
 
         # Sleep while there is work to be done still
@@ -64,6 +72,7 @@ class Downscaling(Thread):
 
         # Copy the master log back
         self.workload.scp_log_back()
+        self.condor_poller.stop()
 
         # Terminate some/all instances
 
@@ -71,6 +80,9 @@ class Downscaling(Thread):
         self.phantom_client.delete_all_domains()
         #self.master.terminate()
 
+        get_pool().close_all()
+        close_logs()
+
         return
 
 def clean_exit(signum, frame):
@@ -84,6 +96,9 @@ def main():
     configure_logging(options.debug)
 
     config = Config(options)
+    get_pool().idle_timeout = config.globals.ssh_idle_timeout
+    get_retry_policy().deadline = config.globals.ssh_retry_deadline
+    get_breakers().reset_timeout = config.globals.ssh_host_down_timeout
 
     signal.signal(signal.SIGINT, clean_exit)
     downscaling = Downscaling(config)
@@ -0,0 +1,78 @@
+import glob
+import hashlib
+import os
+
+import numpy
+
+from parsing import log_parser
+
+# Parsed logs are cached in this directory next to the logs
+CACHE_DIR_NAME = ".graph_cache"
+
+# worker_pool.log: one row per line (timestamp, instances in hotel, instances in sierra)
+WORKER_POOL_DTYPE = numpy.dtype([("timestamp", "f8"), ("hotel_data", "i8"), ("sierra_data", "i8")])
+# failure.log: one row per detected failure
+FAILURE_DTYPE = numpy.dtype([("timestamp", "f8")])
+
+def parse_worker_pool_log(worker_pool_log):
+    rows = []
+    with open(worker_pool_log) as file_object:
+        for line in file_object:
+            if line.strip():
+                data_as_array = line.strip().split()[-1].split(",")
+                rows.append((float(data_as_array[0]), int(data_as_array[2].split(":")[1]),
+                             int(data_as_array[1].split(":")[1])))
+    return numpy.array(rows, dtype=WORKER_POOL_DTYPE)
+
+def parse_failure_log(failure_log):
+    rows = []
+    with open(failure_log) as file_object:
+        for line in file_object:
+            if line.strip():
+                rows.append((float(line.strip().split()[2].split(",")[0]),))
+    return numpy.array(rows, dtype=FAILURE_DTYPE)
+
+def parse_condor_log(condor_log):
+    """ Jobs of the Condor user log as a structured array (log_parser.JOB_DTYPE) """
+
+    cpobj = log_parser.CondorParser(condor_log)
+    cpobj.parse_incremental()
+    return cpobj.to_array()
+
+def cache_key(source):
+    """ Identifies the current content of the source file by its path, size and modification time """
+
+    stat = os.stat(source)
+    return hashlib.md5("%s:%d:%r" % (os.path.abspath(source), stat.st_size, stat.st_mtime)).hexdigest()
+
+def load(source, parse, cache_dir=None):
+    """ Returns the array parse(source) returns, read (memory-mapped) from the cache if the source file has not
+    changed since it was cached; otherwise the source is parsed and the cache entry replaced """
+
+    if cache_dir == None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(source)), CACHE_DIR_NAME)
+    prefix = "%s.%s" % (os.path.basename(source), parse.__name__)
+    cache_file = os.path.join(cache_dir, "%s.%s.npy" % (prefix, cache_key(source)))
+    if os.path.isfile(cache_file):
+        return numpy.load(cache_file, mmap_mode='r')
+
+    data = parse(source)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    # Entries for older versions of the source are not valid anymore
+    for stale_file in glob.glob(os.path.join(cache_dir, "%s.*.npy" % (prefix))):
+        os.remove(stale_file)
+    temp_file = "%s.tmp" % (cache_file)
+    with open(temp_file, 'wb') as file_obj:
+        numpy.save(file_obj, data)
+    os.rename(temp_file, cache_file)
+    return data
+
+def load_columns(source, parse, cache_dir=None):
+    """ Same as load, as a dictionary: column name -> array """
+
+    data = load(source, parse, cache_dir)
+    columns = {}
+    for name in data.dtype.names:
+        columns[name] = data[name]
+    return columns
@@ -4,6 +4,7 @@ import datetime
 import os
 import sys
 from lib.util import read_config
+from graphing import cache
 
 
 class VMDistribution(object):
@@ -24,30 +25,10 @@ class VMDistribution(object):
 
 
     def parse_input_file(self):
-        data_base = {"timestamp":[], "hotel_data":[], "sierra_data":[]}
-        with open(self.input_file) as file_object:
-            for line in file_object:
-                if line :
-                    line_as_array = line.strip().split()
-                    data_as_array = line_as_array[-1].split(",")
-                    hotel_data = int(data_as_array[2].split(":")[1])
-                    sierra_data = int(data_as_array[1].split(":")[1])
-                    timestamp = float(data_as_array[0])
-                    data_base["hotel_data"].append(hotel_data)
-                    data_base["sierra_data"].append(sierra_data)
-                    data_base["timestamp"].append(timestamp)
-        return data_base
+        return cache.load_columns(self.input_file, cache.parse_worker_pool_log)
 
     def parse_failure_file(self):
-        data_base = {"timestamp":[]}
-        with open(self.failure_file) as file_object:
-            for line in file_object:
-                if line :
-                    line_as_array = line.strip().split()
-                    data_as_array = line_as_array[2].split(",")
-                    timestamp = float(data_as_array[0])
-                    data_base['timestamp'].append(timestamp)
-        return data_base
+        return cache.load_columns(self.failure_file, cache.parse_failure_log)
 
     def graph_data_with_date_and_failure(self):
 
@@ -1,61 +1,58 @@
 import numpy
 import matplotlib.pyplot
-import datetime
 import random
 import os
 import sys
-import time
 
 from lib.util import read_config
-from parsing import log_parser
+from graphing import cache
+from parsing import metrics
+
+def count_time_data(begin_offsets, end_offsets, total_seconds, bin_size=1):
+    """ Counts jobs that have begun (and have not ended, if end_offsets are given) at every bin_size-th second
+
+    Offsets are integer arrays of seconds from the start of the experiment. Each job adds +1 to the
+    difference array at the first sampled second >= its begin offset and -1 at the first one >= its end
+    offset; the counts are the cumulative sum. Returns x values (seconds) and counts as numpy arrays
+    """
+
+    x_values = numpy.arange(0, total_seconds, bin_size)
+    bins = len(x_values)
+    # index of the first sample at or after the offset: ceil(offset / bin_size), clipped to the plotted range
+    begin_bins = numpy.clip(-(-begin_offsets // bin_size), 0, bins)
+    diff = numpy.bincount(begin_bins, minlength=bins + 1)
+    if end_offsets is not None:
+        end_bins = numpy.clip(-(-end_offsets // bin_size), 0, bins)
+        diff = diff - numpy.bincount(end_bins, minlength=bins + 1)
+    jobs = numpy.cumsum(diff)[:bins]
+    return x_values, jobs
 
 class CondorAndJobs(object):
 
     def __init__(self, input_dir):
         self.input_dir = input_dir
         self.config_data = read_config(os.path.join(self.input_dir,"workers.conf"))
-        self.cpobj = log_parser.CondorParser(os.path.join(self.input_dir,"sleep.log"))
-        self.cpobj.parse_file()
-        self.condor_data = self.cpobj.condor_jobs_db
+        # Completed jobs (structured array) used by all the computations below
+        self.jobs = metrics.completed(cache.load(os.path.join(self.input_dir,"sleep.log"), cache.parse_condor_log))
 
     def get_start_time(self):
-        alist = []
-        for ek, ev in self.condor_data.iteritems():
-            alist.append(time.mktime(ev.submitted_time))
-        return int(min(alist))
+        return int(self.jobs["submitted"].min())
 
     def get_end_time(self):
-        alist = []
-        for ek, ev in self.condor_data.iteritems():
-            alist.append(time.mktime(ev.terminated_time))
-        return int(max(alist))
+        return int(self.jobs["terminated"].max())
 
     def get_jobs_time(self,jobs_time):
-        alist = []
-        for ek, ev in self.condor_data.iteritems():
-            if jobs_time == "scheduled" or jobs_time == "running":
-                alist.append(time.mktime(ev.scheduled_time))
-            elif jobs_time == "submitted":
-                alist.append(time.mktime(ev.submitted_time))
-            elif jobs_time == "terminated" or jobs_time == "completed":
-                alist.append(time.mktime(ev.terminated_time))
-        return alist
+        if jobs_time == "scheduled" or jobs_time == "running":
+            return self.jobs["scheduled"]
+        elif jobs_time == "submitted":
+            return self.jobs["submitted"]
+        elif jobs_time == "terminated" or jobs_time == "completed":
+            return self.jobs["terminated"]
+        return numpy.zeros(0, dtype=numpy.int64)
 
 
     def parse_input_file(self):
-        data_base = {"timestamp":[], "hotel_data":[], "sierra_data":[]}
-        with open(os.path.join(self.input_dir,"worker_pool.log")) as file_object:
-            for line in file_object:
-                if line :
-                    line_as_array = line.strip().split()
-                    data_as_array = line_as_array[-1].split(",")
-                    hotel_data = int(data_as_array[2].split(":")[1])
-                    sierra_data = int(data_as_array[1].split(":")[1])
-                    timestamp = float(data_as_array[0])
-                    data_base["hotel_data"].append(hotel_data)
-                    data_base["sierra_data"].append(sierra_data)
-                    data_base["timestamp"].append(timestamp)
-        return data_base
+        return cache.load_columns(os.path.join(self.input_dir,"worker_pool.log"), cache.parse_worker_pool_log)
 
     def get_desired_data(self):
         desired_dict = {"hotel":0, "sierra":0}
@@ -64,105 +61,46 @@ class CondorAndJobs(object):
         return desired_dict
 
 
-    def generate_submitted_time_data(self):
-        end_time = self.get_end_time()
-        start_time = self.get_start_time()
-        total_seconds = int((datetime.datetime.fromtimestamp(end_time) - datetime.datetime.fromtimestamp(start_time)).total_seconds())
-        x_values = range(total_seconds)
-        jobs = [0] * len(x_values)
-
-        for job_id, job_times in self.condor_data.iteritems():
-
-
-        # how far are we from zero when the jobs was terminated
-            seconds_when_jobs_submitted = int(time.mktime(job_times.submitted_time) - start_time )
-
-            #print "we are this %d far from zero when we submitted" % (seconds_when_jobs_submitted)
-
-            # the range we need to update
-            range_to_alter = range(seconds_when_jobs_submitted, total_seconds)
-
-            #print "the range to alter is %s" % str(range_to_alter)
-
-            for index in range_to_alter:
-                jobs[index] += 1
+    def get_experiment_span(self):
+        """ Returns start time (epoch) and the number of seconds in the experiment """
 
-        return x_values, jobs
-
-
-    def generate_completed_time_data(self):
-
-        end_time = self.get_end_time()
         start_time = self.get_start_time()
-        total_seconds = int((datetime.datetime.fromtimestamp(end_time) - datetime.datetime.fromtimestamp(start_time)).total_seconds())
-        x_values = range(total_seconds)
-        jobs = [0] * len(x_values)
-        for job_id, job_times in self.condor_data.iteritems():
-
-            # how far are we from zero when the jobs was terminated
-            seconds_when_jobs_terminated = int(time.mktime(job_times.terminated_time) - start_time )
-
-            #print "we are this %d far from zero when we terminated" % (seconds_when_jobs_terminated)
-
-            # the range we need to update
-            range_to_alter = range(seconds_when_jobs_terminated, total_seconds)
-
-            #print "the range to alter is %s" % str(range_to_alter)
-
-            for index in range_to_alter:
-                jobs[index] += 1
-
-        return x_values, jobs
-
-
-    def generate_running_time_data(self):
-
         end_time = self.get_end_time()
-        start_time = self.get_start_time()
-        total_seconds = int((datetime.datetime.fromtimestamp(end_time) - datetime.datetime.fromtimestamp(start_time)).total_seconds())
-        x_values = range(total_seconds)
-        jobs = [0] * len(x_values)
-        for job_id, job_times in self.condor_data.iteritems():
-
-
-        # how far are we from zero when the job was started
-            seconds_when_jobs_start_running = int(time.mktime(job_times.scheduled_time) - start_time)
-
-            #print "we are this %d far from zero when we begin" % (seconds_when_jobs_start_running)
-
-            # how far are we from zero when the jobs was terminated
-            seconds_when_jobs_terminated = int(time.mktime(job_times.terminated_time) - start_time )
-
-            #print "we are this %d far from zero when we terminated" % (seconds_when_jobs_terminated)
-
-            # the range we need to update
-            range_to_alter = range(seconds_when_jobs_start_running, seconds_when_jobs_terminated)
-
-            #print "the range to alter is %s" % str(range_to_alter)
-
-            for index in range_to_alter:
-                jobs[index] += 1
-
-        return x_values, jobs
-
+        return start_time, end_time - start_time
 
+    def generate_submitted_time_data(self, bin_size=1):
+        # number of jobs submitted by each second (every bin_size seconds)
+        start_time, total_seconds = self.get_experiment_span()
+        submitted = numpy.array(self.get_jobs_time("submitted"), dtype=numpy.int64) - start_time
+        return count_time_data(submitted, None, total_seconds, bin_size)
 
+    def generate_completed_time_data(self, bin_size=1):
+        # number of jobs completed by each second (every bin_size seconds)
+        start_time, total_seconds = self.get_experiment_span()
+        terminated = numpy.array(self.get_jobs_time("terminated"), dtype=numpy.int64) - start_time
+        return count_time_data(terminated, None, total_seconds, bin_size)
 
+    def generate_running_time_data(self, bin_size=1):
+        # number of jobs running at each second (every bin_size seconds)
+        start_time, total_seconds = self.get_experiment_span()
+        scheduled = numpy.array(self.get_jobs_time("scheduled"), dtype=numpy.int64) - start_time
+        terminated = numpy.array(self.get_jobs_time("terminated"), dtype=numpy.int64) - start_time
+        return count_time_data(scheduled, terminated, total_seconds, bin_size)
 
-    def draw(self):
+    def draw(self, bin_size=1):
 
         # condor :
 
         fig = matplotlib.pyplot.figure()
         ax = fig.add_subplot(2,1,1)
 
-        cx, cy = self.generate_completed_time_data()
+        cx, cy = self.generate_completed_time_data(bin_size)
         lns1 = ax.plot(cx,cy, '-g', label="completed")
 
-        sx, sy = self.generate_submitted_time_data()
+        sx, sy = self.generate_submitted_time_data(bin_size)
         lns2 = ax.plot(sx,sy, '-b', label="submitted")
 
-        rx, ry = self.generate_running_time_data()
+        rx, ry = self.generate_running_time_data(bin_size)
         ax2 = ax.twinx()
         lns3 = ax2.plot(rx, ry, '-r', label = 'running')
 
@@ -217,5 +155,9 @@ class CondorAndJobs(object):
 
 if __name__ == '__main__':
     grapher = CondorAndJobs(sys.argv[1])
-    grapher.draw()
+    # Optional second argument: time bin in seconds (default: 1)
+    if len(sys.argv) > 2:
+        grapher.draw(int(sys.argv[2]))
+    else:
+        grapher.draw()
 
@@ -3,7 +3,9 @@ import datetime
 import os
 
 from lib.util import read_config
-from lib.util import Command
+from lib.util import Command, parse_runtime
+from lib.sshpool import DEFAULT_IDLE_TIMEOUT
+from lib.retry import DEFAULT_RETRY_DEADLINE, DEFAULT_RESET_TIMEOUT
 
 LOG = logging.getLogger(__name__)
 
@@ -18,6 +20,10 @@ class GlobalConfig(object):
         self.pub_path = default_dict['pub_path']
         self.priv_path = default_dict['priv_path']
         self.initial_monitor_time_limit = default_dict['initial_monitor_time_limit']
+        self.ssh_idle_timeout = int(default_dict.get('ssh_idle_timeout', DEFAULT_IDLE_TIMEOUT))
+        self.condor_poll_interval = int(default_dict.get('condor_poll_interval', 30))
+        self.ssh_retry_deadline = int(default_dict.get('ssh_retry_deadline', DEFAULT_RETRY_DEADLINE))
+        self.ssh_host_down_timeout = int(default_dict.get('ssh_host_down_timeout', DEFAULT_RESET_TIMEOUT))
 
 class MasterConfig(object):
     """
@@ -82,6 +88,10 @@ class WorkloadConfig(object):
         self.directory = default_dict['directory']
         self.submit_remote = default_dict['submit_remote']
         self.log_remote = default_dict['log_remote']
+        # Trace file (optional): if given, jobs are submitted from it instead of the directory with submit files
+        self.trace = default_dict.get('trace')
+        # Jobs of the trace that arrive within this many seconds are submitted together
+        self.submit_window = float(default_dict.get('submit_window', 0))
 
 class PolicyConfig(object):
 
@@ -89,9 +99,12 @@ class PolicyConfig(object):
         self.afile = afile
         self.config = read_config(self.afile)
         default_dict = self.config.defaults()
-        self.threshold = default_dict['threshold']
+        # Threshold is given as Condor runtime (D+HH:MM:SS), kept in seconds
+        self.threshold = parse_runtime(default_dict['threshold'])
         self.downscaler_interval = int(default_dict['downscaler_interval'])
         self.policy_in_place = default_dict['policy_in_place']
+        # Number of workers stopped, terminated or marked offline at the same time
+        self.worker_parallelism = int(default_dict.get('worker_parallelism', 8))
 
 class Config(object):
     """ Config class retrieves all configuration information """
@@ -121,6 +134,7 @@ class Config(object):
         self.worker_pool_log = "%s/%s" % (self.log_dir, options.worker_pool_log)
         self.discarded_work_log = "%s/%s" % (self.log_dir, options.discarded_work_log)
         self.failure_log = "%s/%s" % (self.log_dir, options.failure_log)
+        self.arrival_log = "%s/%s" % (self.log_dir, options.arrival_log)
 
         # to keep current code running for now
         self.threshold = self.policy.threshold
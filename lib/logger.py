@@ -1,5 +1,16 @@
+import atexit
 import logging
 import datetime
+import threading
+
+from Queue import Queue, Empty
+
+LOG = logging.getLogger(__name__)
+
+# Lines waiting to be written; filelog blocks only when this many are pending
+FILELOG_QUEUE_SIZE = 10000
+# Seconds between flushes of the open log files
+FILELOG_FLUSH_INTERVAL = 1
 
 def configure_logging(debug=False):
     formatter = logging.Formatter("%(asctime)s - %(name)-16s - "
@@ -13,8 +24,124 @@ def configure_logging(debug=False):
         logging.getLogger('').setLevel(logging.INFO)
 
 
+class FileLogWriter(threading.Thread):
+    """ FileLogWriter thread writes the lines given to filelog
+
+    Every log file is opened once (line-buffered, in append mode) and kept open. Lines are passed through
+    a bounded queue; the thread writes all pending lines of a file at once and flushes the files every
+    FILELOG_FLUSH_INTERVAL seconds and when flush() is called
+
+    """
+    def __init__(self, queue_size=FILELOG_QUEUE_SIZE, flush_interval=FILELOG_FLUSH_INTERVAL):
+
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.queue = Queue(queue_size)
+        self.flush_interval = flush_interval
+        self.files = {}
+        self.stopped = False
+
+    def write(self, file_name, line):
+        self.queue.put((file_name, line))
+
+    def flush(self, stop=False):
+        """ Returns when everything written before the call is on its way to disk (optionally stops the thread) """
+
+        done = threading.Event()
+        self.queue.put((None, (done, stop)))
+        # The writer may have died: don't wait forever
+        done.wait(10 * self.flush_interval + 10)
+
+    def run(self):
+
+        while not self.stopped:
+            try:
+                items = [self.queue.get(timeout=self.flush_interval)]
+            except Empty:
+                items = []
+            while True:
+                try:
+                    items.append(self.queue.get_nowait())
+                except Empty:
+                    break
+            self.write_items(items)
+
+        for log_file in self.files.values():
+            log_file.close()
+        self.files = {}
+
+    def write_items(self, items):
+
+        lines = {}
+        order = []
+        flush_requests = []
+        for file_name, line in items:
+            if file_name == None:
+                flush_requests.append(line)
+                continue
+            if not file_name in lines:
+                lines[file_name] = []
+                order.append(file_name)
+            lines[file_name].append(line)
+
+        for file_name in order:
+            try:
+                log_file = self.files.get(file_name)
+                if log_file == None:
+                    log_file = open(file_name, "a", 1)
+                    self.files[file_name] = log_file
+                log_file.write("".join(lines[file_name]))
+            except IOError as ex:
+                LOG.error("Could not write to %s: %s" % (file_name, str(ex)))
+
+        for log_file in self.files.values():
+            try:
+                log_file.flush()
+            except IOError as ex:
+                LOG.error("Could not flush %s: %s" % (log_file.name, str(ex)))
+
+        for done, stop in flush_requests:
+            if stop:
+                self.stopped = True
+            done.set()
+
+
+WRITER = None
+WRITER_LOCK = threading.Lock()
+
+def get_writer():
+    """ Returns the writer thread, starting it on first use """
+
+    global WRITER
+    with WRITER_LOCK:
+        if WRITER == None or not WRITER.is_alive():
+            WRITER = FileLogWriter()
+            WRITER.start()
+        return WRITER
+
 def filelog(file_name, message):
 
+    # The timestamp is taken now, not when the line is written
     timestamp = datetime.datetime.now()
-    with open(file_name, "a") as log:
-        log.write("%s %s\n" % (timestamp, message))
\ No newline at end of file
+    get_writer().write(file_name, "%s %s\n" % (timestamp, message))
+
+def flush_logs():
+    """ Writes out all lines given to filelog so far """
+
+    with WRITER_LOCK:
+        writer = WRITER
+    if writer and writer.is_alive():
+        writer.flush()
+
+def close_logs():
+    """ Writes out all pending lines and closes the log files; filelog may still be used afterwards """
+
+    global WRITER
+    with WRITER_LOCK:
+        writer = WRITER
+        WRITER = None
+    if writer and writer.is_alive():
+        writer.flush(stop=True)
+        writer.join(FILELOG_FLUSH_INTERVAL + 10)
+
+atexit.register(close_logs)
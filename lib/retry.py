@@ -0,0 +1,127 @@
+import logging
+import random
+import threading
+import time
+
+LOG = logging.getLogger(__name__)
+
+# Total seconds a call may spend retrying (default)
+DEFAULT_RETRY_DEADLINE = 60
+# Consecutive failures after which a host is considered down (default)
+DEFAULT_FAILURE_THRESHOLD = 3
+# Seconds a host is considered down before a trial call is let through (default)
+DEFAULT_RESET_TIMEOUT = 30
+
+class RetryPolicy(object):
+    """ RetryPolicy class decides how long to wait before the next attempt of a failed call
+
+    Delays grow exponentially (initial_delay * multiplier^retry, at most max_delay) and are randomly shortened
+    by up to jitter (a fraction), so threads that failed at the same time do not retry in lockstep. No retry
+    is made after max_retries retries or if the delay would end after deadline seconds from the first attempt
+
+    """
+    def __init__(self, initial_delay=1, max_delay=15, multiplier=2, jitter=0.5, max_retries=10,
+                 deadline=DEFAULT_RETRY_DEADLINE):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.max_retries = max_retries
+        self.deadline = deadline
+
+    def get_delay(self, retry, start_time, now=None):
+        """ Returns seconds to wait before the retry (counted from 1), None if the call should give up """
+
+        if retry > self.max_retries:
+            return None
+        if now == None:
+            now = time.time()
+        delay = min(self.max_delay, self.initial_delay * self.multiplier ** (retry - 1))
+        delay *= 1 - random.uniform(0, self.jitter)
+        if self.deadline != None and now + delay - start_time > self.deadline:
+            return None
+        return delay
+
+
+class CircuitBreaker(object):
+    """ CircuitBreaker class tracks whether calls to one host are failing
+
+    A call is checked with allow() before it starts and reports its outcome once, after all its retries.
+    After failure_threshold consecutive failed calls the circuit opens: calls are refused right away for
+    reset_timeout seconds. Then one trial call is let through (half-open); its success closes the circuit,
+    its failure opens it again
+
+    """
+    def __init__(self, hostname, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.hostname = hostname
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def allow(self):
+        """ Returns True if a call to the host may be made now """
+
+        with self.lock:
+            if self.opened_at == None:
+                return True
+            if self.trial or time.time() - self.opened_at < self.reset_timeout:
+                return False
+            # Half-open: only this call goes through until it succeeds or fails
+            self.trial = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_at != None:
+                LOG.info("Host %s is reachable again" % (self.hostname))
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or (self.opened_at == None and self.failures >= self.failure_threshold):
+                LOG.error("Host %s is considered down for %d sec after %d failures"
+                          % (self.hostname, self.reset_timeout, self.failures))
+                self.opened_at = time.time()
+            self.trial = False
+
+    def is_open(self):
+        with self.lock:
+            return self.opened_at != None
+
+
+class CircuitBreakers(object):
+    """ Circuit breakers by host, shared by all threads """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.breakers = {}
+
+    def get(self, hostname):
+        with self.lock:
+            breaker = self.breakers.get(hostname)
+            if breaker == None:
+                breaker = CircuitBreaker(hostname, self.failure_threshold, self.reset_timeout)
+                self.breakers[hostname] = breaker
+            return breaker
+
+
+RETRY_POLICY = RetryPolicy()
+BREAKERS = CircuitBreakers()
+
+def get_retry_policy():
+    """ Retry policy used by remote commands that are not given one """
+    return RETRY_POLICY
+
+def get_breakers():
+    return BREAKERS
+
+def get_breaker(hostname):
+    return BREAKERS.get(hostname)
@@ -0,0 +1,193 @@
+import logging
+import os
+import threading
+import time
+
+import paramiko
+
+LOG = logging.getLogger(__name__)
+
+# Seconds an unused session is kept open
+DEFAULT_IDLE_TIMEOUT = 300
+# Sessions idle for longer than this are probed before they are handed out
+HEALTH_CHECK_AFTER = 30
+# OpenSSH client configuration consulted for host names, ports and extra keys
+SSH_CONFIG_FILE = "~/.ssh/config"
+
+class PooledConnection(object):
+
+    def __init__(self, key, client):
+        self.key = key
+        self.client = client
+        self.created = time.time()
+        self.last_used = self.created
+        # Number of commands handed this session and not finished yet (changed with the pool lock held)
+        self.in_use = 0
+
+    def is_alive(self):
+        """ Checks the transport; sessions that sat idle for a while are also probed with an SSH_MSG_IGNORE """
+
+        transport = self.client.get_transport()
+        if transport == None or not transport.is_active():
+            return False
+        if time.time() - self.last_used > HEALTH_CHECK_AFTER:
+            try:
+                transport.send_ignore()
+            except Exception as ex:
+                LOG.debug("Health check failed for %s@%s: %s" % (self.key[1], self.key[0], str(ex)))
+                return False
+        return True
+
+    def close(self):
+        try:
+            self.client.close()
+        except Exception as ex:
+            LOG.debug("Exception in closing ssh connection to %s: %s" % (self.key[0], str(ex)))
+
+
+def load_ssh_config():
+    """ Returns the parsed OpenSSH client configuration, None if there is none or it can't be read """
+
+    config_file = os.path.expanduser(SSH_CONFIG_FILE)
+    if not os.path.isfile(config_file):
+        return None
+    ssh_config = paramiko.SSHConfig()
+    try:
+        with open(config_file) as file_obj:
+            ssh_config.parse(file_obj)
+    except IOError as ex:
+        LOG.error("Could not read %s: %s" % (config_file, str(ex)))
+        return None
+    return ssh_config
+
+
+class SSHConnectionPool(object):
+    """ Thread-safe pool of authenticated SSH sessions keyed by (host, user, key)
+
+    A session is opened once and shared by all threads: every command runs in its own channel
+    on top of the same transport. Sessions are evicted when they have been idle for longer than
+    idle_timeout, when a health check fails, or when a command fails on them.
+
+    Authentication works as it did with fabric: the given private key is tried first, then the keys of
+    the ssh agent and the default keys in ~/.ssh; HostName, Port and IdentityFile from ~/.ssh/config apply.
+
+    """
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT, connect_timeout=5):
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.lock = threading.Lock()
+        self.connections = {}
+        self.ssh_config = load_ssh_config()
+
+    def get(self, hostname, user, ssh_private_key):
+        """ Returns a pooled connection, opening a new session if there is no healthy one; the caller must
+        call release when its command is done """
+
+        key = (hostname, user, ssh_private_key)
+        with self.lock:
+            self.evict_idle()
+            connection = self.connections.get(key)
+            if connection:
+                connection.in_use += 1
+        if connection and connection.is_alive():
+            connection.last_used = time.time()
+            return connection
+        if connection:
+            self.release(connection)
+            self.evict(connection)
+
+        # Connect outside of the lock: a handshake to one host must not hold up other hosts
+        new_connection = PooledConnection(key, self.connect(hostname, user, ssh_private_key))
+        with self.lock:
+            connection = self.connections.get(key)
+            if connection == None:
+                new_connection.in_use += 1
+                self.connections[key] = new_connection
+                return new_connection
+            connection.in_use += 1
+        # Another thread has connected in the meantime
+        new_connection.close()
+        connection.last_used = time.time()
+        return connection
+
+    def release(self, connection):
+        """ Marks the end of a command on a connection returned by get """
+
+        with self.lock:
+            connection.in_use -= 1
+            connection.last_used = time.time()
+
+    def connect(self, hostname, user, ssh_private_key):
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        host_config = {}
+        if self.ssh_config:
+            host_config = self.ssh_config.lookup(hostname)
+        key_filenames = [ssh_private_key] + [os.path.expanduser(identity_file)
+                                             for identity_file in host_config.get('identityfile', [])]
+        client.connect(host_config.get('hostname', hostname), port=int(host_config.get('port', 22)),
+                       username=user, key_filename=key_filenames, timeout=self.connect_timeout,
+                       allow_agent=True, look_for_keys=True)
+        LOG.debug("Opened ssh connection %s@%s" % (user, hostname))
+        return client
+
+    def evict(self, connection):
+        with self.lock:
+            if self.connections.get(connection.key) is connection:
+                del self.connections[connection.key]
+        connection.close()
+
+    def evict_idle(self):
+        """ Closes sessions that have not been used for idle_timeout seconds; must be called with the lock held
+
+        Sessions with commands still running on them are never idle, however long the commands take
+        """
+
+        now = time.time()
+        for key, connection in self.connections.items():
+            if connection.in_use == 0 and now - connection.last_used > self.idle_timeout:
+                del self.connections[key]
+                connection.close()
+
+    def run(self, hostname, user, ssh_private_key, command, stdin=None):
+        """ Runs a command over a pooled session, returns (return code, output)
+
+        stdin (optional) is written to the standard input of the command, which is then closed.
+        stderr is merged into the output. Any exception evicts the session and is re-raised
+        """
+
+        connection = self.get(hostname, user, ssh_private_key)
+        try:
+            channel = connection.client.get_transport().open_session()
+            channel.set_combine_stderr(True)
+            channel.exec_command(command)
+            if stdin != None:
+                channel.sendall(stdin)
+                channel.shutdown_write()
+            output = []
+            while True:
+                data = channel.recv(32768)
+                if not data:
+                    break
+                output.append(data)
+            return_code = channel.recv_exit_status()
+            channel.close()
+        except Exception:
+            self.release(connection)
+            self.evict(connection)
+            raise
+        self.release(connection)
+        return return_code, "".join(output)
+
+    def close_all(self):
+        with self.lock:
+            connections = self.connections.values()
+            self.connections = {}
+        for connection in connections:
+            connection.close()
+
+
+POOL = SSHConnectionPool()
+
+def get_pool():
+    return POOL
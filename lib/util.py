@@ -7,13 +7,13 @@ import time
 
 from ConfigParser import SafeConfigParser
 from optparse import OptionParser
-from fabric import api as fabric_api
-from fabric import state
 from lib.logger import filelog
+from lib.sshpool import get_pool
+from lib.retry import get_retry_policy, get_breaker
 
 LOG = logging.getLogger(__name__)
 
-# Less information from paramiko (fabric)
+# Less information from paramiko
 logging.getLogger("paramiko").setLevel(logging.WARNING)
 
 class Command(object):
@@ -34,8 +34,12 @@ class Command(object):
 class RemoteCommand(object):
     """Run a command in a remote machine.
 
-    Given a machine address, a none interactive command and ssh key, the function uses fabric
-    to execute the command in the remote machines.
+    Given a machine address, a none interactive command and ssh key, the function executes
+    the command in the remote machine over a pooled ssh session (see lib.sshpool).
+
+    Failed attempts (the host could not be reached) are retried as the retry policy says (see lib.retry).
+    While the host is known to be down (its circuit breaker is open) the command fails right away; a command
+    that runs out of retries counts as one failure of the host.
 
     Args:
 
@@ -45,22 +49,30 @@ class RemoteCommand(object):
 
         command ( string ) : command to execute
 
+        stdin ( string ) : data written to the standard input of the command (optional)
+
+        log_output ( bool ) : whether the output is written to the remote log (default: True)
+
+        retry_policy ( RetryPolicy ) : delays between attempts (default: lib.retry.get_retry_policy())
+
 
     Return:
 
-        bool
+        return code of the command, None if it could not be run
 
     """
 
-    def __init__(self, config, hostname, ssh_private_key, user, command, retry_interval=5, retry_limit=10):
+    def __init__(self, config, hostname, ssh_private_key, user, command, retry_policy=None, stdin=None,
+                 log_output=True):
         self.stdout = None
         self.stderr = None
         self.command = command
+        self.stdin = stdin
+        self.log_output = log_output
         self.hostname = hostname
         self.user = user
         self.ssh_private_key = ssh_private_key
-        self.retry_interval = retry_interval
-        self.retry_limit = retry_limit
+        self.retry_policy = retry_policy or get_retry_policy()
         self.retry_count = 0
         self.remote_log = config.remote_log
 
@@ -69,54 +81,50 @@ class RemoteCommand(object):
         filelog(self.remote_log, "Host: %s, User: %s, CMD: %s" %
                                  (self.hostname, self.user, self.command))
 
-        while self.retry_count <= self.retry_limit:
-
-            if os.path.isfile(self.ssh_private_key):
-                context = fabric_api.settings(fabric_api.hide('running', 'stdout', 'stderr', 'warnings'),
-                    user=self.user,
-                    key_filename=[].append(self.ssh_private_key),
-                    disable_known_hosts=True,
-                    linewise=True,
-                    warn_only=True,
-                    abort_on_prompts=True,
-                    always_use_pty=True,
-                    timeout=5,
-                    use_ssh_config=True)
-            else:
-                LOG.error("Path to ssh private key is invalid")
-                return None
+        if not os.path.isfile(self.ssh_private_key):
+            LOG.error("Path to ssh private key is invalid")
+            return None
+
+        pool = get_pool()
+        # The breaker is consulted once per call: a call that is let through retries as its policy says,
+        # and counts as one failure for the host if it gives up
+        breaker = get_breaker(self.hostname)
+        if not breaker.allow():
+            LOG.error("Host %s is down, not running remote command: %s" % (self.hostname, self.command))
+            filelog(self.remote_log, "Error: host %s is down" % (self.hostname))
+            return None
+
+        start_time = time.time()
+        while True:
             try:
-                #print "my cache state is %s" % (str(state.connections))
-                for host_key in state.connections.keys():
-                    state.connections.pop(host_key)
-            except Exception as ex:
-                print "Exception in dealing with fabric cache %s " % (str(ex))
-
-
-            if context:
-                with context:
-                    try:
-                        fabric_api.env.host_string = self.hostname
-                        results = fabric_api.run(self.command)
-                        self.stdout = results.stdout
-                        self.stderr = results.stderr
-                        filelog(self.remote_log, "Error: %s" % (self.stderr))
-                        filelog(self.remote_log, "Output: %s" % (self.stdout))
-                        #print "return code from command %s is %s" % (self.command, str(results.return_code))
-                        #print "stderr : %s" % (self.stderr)
-                        return results.return_code
-                    except Exception as exptErr:
-                        self.retry_count +=1
-                        errmsg = str(exptErr)
-                        LOG.info("Exception in running remote command: %s" % (errmsg))
-                        time.sleep(self.retry_interval)
-                        LOG.info("Trying to execute remote command again. Retry: %d/%d" % (self.retry_count, self.retry_limit))
-
+                # Sessions to the same host are shared between commands and threads
+                return_code, output = pool.run(self.hostname, self.user, self.ssh_private_key, self.command,
+                                               self.stdin)
+            except Exception as exptErr:
+                self.retry_count +=1
+                errmsg = str(exptErr)
+                LOG.info("Exception in running remote command: %s" % (errmsg))
+                # No sleep if there is no next attempt
+                delay = self.retry_policy.get_delay(self.retry_count, start_time)
+                if delay == None:
+                    break
+                time.sleep(delay)
+                LOG.info("Trying to execute remote command again. Retry: %d/%d" % (self.retry_count, self.retry_policy.max_retries))
+                continue
+
+            breaker.record_success()
+            # stderr is merged into stdout (as it was with the pty used before)
+            self.stdout = output.strip()
+            self.stderr = ""
+            filelog(self.remote_log, "Error: %s" % (self.stderr))
+            if self.log_output:
+                filelog(self.remote_log, "Output: %s" % (self.stdout))
             else:
-                LOG.error("Problem occurred while initializing fabric context")
-                return None
+                filelog(self.remote_log, "Output: %d bytes" % (len(self.stdout)))
+            return return_code
 
-        LOG.error("Could not execute remote command. Number of retries exceeded the limit")
+        breaker.record_failure()
+        LOG.error("Could not execute remote command. Retries exceeded the limit or the deadline")
         return None
 
 
@@ -181,6 +189,10 @@ def parse_options():
         help="Location of the failure log file (default: failure.log).")
     parser.set_defaults(failure_log="failure.log")
 
+    parser.add_option("-a", "--arrival_log", action="store", dest="arrival_log",
+        help="Location of the log file with intended and achieved job arrivals (default: arrival.log).")
+    parser.set_defaults(arrival_log="arrival.log")
+
     (options, args) = parser.parse_args()
     return (options, args)
 
@@ -244,6 +256,37 @@ def is_executable_file(file_path):
     """
     return os.path.isfile(file_path) and os.access(file_path, os.X_OK)
 
+def format_runtime(seconds):
+    """Format a number of seconds as Condor does for job runtimes
+
+    Args:
+        seconds (int) : runtime in seconds
+
+    Return:
+        string : D+HH:MM:SS, e.g. 0+00:15:00
+
+    """
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    return "%d+%02d:%02d:%02d" % (days, hours, minutes, secs)
+
+def parse_runtime(runtime):
+    """Parse a Condor job runtime into a number of seconds
+
+    Args:
+        runtime (string) : D+HH:MM:SS (days may be omitted), e.g. 0+00:15:00
+
+    Return:
+        int : runtime in seconds
+
+    """
+    days = 0
+    if "+" in runtime:
+        days, runtime = runtime.split("+", 1)
+    hours, minutes, seconds = runtime.split(":")
+    return ((int(days) * 24 + int(hours)) * 60 + int(minutes)) * 60 + int(seconds)
+
 def is_yes(input):
 
     return (input == 'Y' or input == 'y' or input == 'Yes' or input == 'yes')
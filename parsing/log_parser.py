@@ -1,132 +1,396 @@
+import cPickle
+import hashlib
+import multiprocessing
+import os
+import re
+import sys
 import time
 
+import numpy
+
+from submit import submit_header
+
+# Condor user log event codes
+EVENT_SUBMITTED = "000"
+EVENT_EXECUTING = "001"
+EVENT_TERMINATED = "005"
+
+# Events are only matched on lines starting with one of these prefixes
+EVENT_PREFIXES = frozenset(["%s " % EVENT_SUBMITTED, "%s " % EVENT_EXECUTING, "%s " % EVENT_TERMINATED])
+
+# 000 (1791.000.000) 11/04 16:44:28 Job submitted from host: <138.253.100.17:40070>
+EVENT_PATTERN = re.compile(r"(\d{3}) \(([\d.]+)\) (\d\d)/(\d\d) (\d\d):(\d\d):(\d\d) ")
+
+# Columnar layout of parsed jobs: epoch seconds, MISSING_TIME if the event was not seen
+JOB_DTYPE = numpy.dtype([("id", "S24"), ("submitted", "i8"), ("scheduled", "i8"), ("terminated", "i8")])
+MISSING_TIME = -1
+
+# Every event record in a Condor user log ends with this line
+RECORD_END = "...\n"
+# Files smaller than this are not worth splitting between processes
+MIN_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Parser state saved next to the log by parse_incremental: <log>.ckpt
+CHECKPOINT_SUFFIX = ".ckpt"
+CHECKPOINT_VERSION = 1
+# Size of the blocks at the beginning and at the end of the parsed prefix that are checksummed
+CHECKSUM_BLOCK = 64 * 1024
+
+# Sleep time (sec) written after the last job of a trace
+LAST_JOB_SLEEP = 120
+
 class CondorJob(object):
 
-    def __init__(self):
+    __slots__ = ("id", "submitted_time", "scheduled_time", "terminated_time")
+
+    def __init__(self, id=None):
 
-        self.id = None
+        self.id = id
+        # Epoch seconds (int), None until the corresponding event is seen
         self.submitted_time = None
         self.scheduled_time = None
         self.terminated_time = None
 
     def __str__(self):
         return "Job id is %s, was submitted on %s and scheduled on %s and terminated on %s" % (
-            self.id, time.strftime("%m-%d %H:%M:%S", self.submitted_time) ,
-            time.strftime("%m-%d %H:%M:%S",self.scheduled_time), time.strftime("%m-%d %H:%M:%S", self.terminated_time))
+            self.id, format_epoch(self.submitted_time), format_epoch(self.scheduled_time),
+            format_epoch(self.terminated_time))
+
+def format_epoch(epoch):
+    if epoch == None:
+        return None
+    return time.strftime("%m-%d %H:%M:%S", time.localtime(epoch))
+
+def or_missing(epoch):
+    if epoch == None:
+        return MISSING_TIME
+    return epoch
+
+def find_chunks(condor_logfile, chunks, start=0, end=None):
+    """ Splits the byte range [start, end) of the log (the whole log by default) into at most the given number
+    of ranges (start, end) that begin and end at event record boundaries """
+
+    if end == None:
+        end = os.path.getsize(condor_logfile)
+    boundaries = [start]
+    with open(condor_logfile) as file_obj:
+        for index in range(1, chunks):
+            offset = start + (end - start) * index // chunks
+            if offset <= boundaries[-1]:
+                continue
+            file_obj.seek(offset)
+            # The line at the offset may be cut, records are looked for from the next one
+            file_obj.readline()
+            while True:
+                line = file_obj.readline()
+                if not line or line == RECORD_END:
+                    break
+            boundary = file_obj.tell()
+            if boundary >= end:
+                break
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+    boundaries.append(end)
+    return zip(boundaries[:-1], boundaries[1:])
+
+def records_end(file_obj, start, end):
+    """ Returns the offset right after the last complete event record in the byte range [start, end)
+    of the log (start if there is none); start must be a record boundary """
+
+    separator = "\n" + RECORD_END
+    position = end
+    following = ""
+    while position > start:
+        read_from = max(start, position - CHECKSUM_BLOCK)
+        file_obj.seek(read_from)
+        data = file_obj.read(position - read_from) + following
+        index = data.rfind(separator)
+        if index >= 0:
+            return read_from + index + len(separator)
+        if read_from == start and data.startswith(RECORD_END):
+            return start + len(RECORD_END)
+        # The separator may span two blocks
+        following = data[:len(separator) - 1]
+        position = read_from
+    return start
+
+def prefix_checksum(file_obj, offset):
+    """ Checksum of the first offset bytes of the log: its length and its first and last CHECKSUM_BLOCK bytes """
+
+    digest = hashlib.md5(str(offset))
+    file_obj.seek(0)
+    digest.update(file_obj.read(min(offset, CHECKSUM_BLOCK)))
+    if offset > CHECKSUM_BLOCK:
+        file_obj.seek(max(CHECKSUM_BLOCK, offset - CHECKSUM_BLOCK))
+        digest.update(file_obj.read(offset - max(CHECKSUM_BLOCK, offset - CHECKSUM_BLOCK)))
+    return digest.hexdigest()
+
+def parse_chunk(args):
+    """ Parses one byte range of the log in a worker process; returns a list of
+    (job id, submitted, scheduled, terminated) tuples, in the order the jobs were first seen """
+
+    condor_logfile, start, end, year, last_month = args
+    parser = CondorParser(condor_logfile, year, last_month)
+    parser.parse_range(start, end)
+    return [(job_id, condor_job.submitted_time, condor_job.scheduled_time, condor_job.terminated_time)
+            for job_id, condor_job in parser.condor_jobs_db.iteritems()]
+
+def log_year(condor_logfile):
+    """ Condor user log timestamps have no year; returns year and month of the log's modification time
+    (when its last event was written) """
+
+    modified = time.localtime(os.path.getmtime(condor_logfile))
+    return modified.tm_year, modified.tm_mon
+
+
+class EpochConverter(object):
+    """ Converts month/day hour:minute:second of a Condor log event into epoch seconds (local time)
+
+    time.mktime is called once per distinct hour (DST changes happen on hour boundaries), the result is memoized.
+    Events from months after the month the log was last written belong to the previous year
+
+    """
+    def __init__(self, year, last_month=12):
+        self.year = year
+        self.last_month = last_month
+        self.hours = {}
+
+    def convert(self, month, day, hour, minute, second):
+        key = (month, day, hour)
+        hour_epoch = self.hours.get(key)
+        if hour_epoch == None:
+            year = self.year
+            if month > self.last_month:
+                year -= 1
+            hour_epoch = int(time.mktime((year, month, day, hour, 0, 0, 0, 0, -1)))
+            self.hours[key] = hour_epoch
+        return hour_epoch + minute * 60 + second
 
 
 class CondorParser(object):
 
-    def __init__(self, condor_logfile):
+    def __init__(self, condor_logfile, year=None, last_month=None):
         self.condor_logfile = condor_logfile
         self.condor_jobs_db = {}
+        if year == None:
+            year, last_month = log_year(condor_logfile)
+        elif last_month == None:
+            last_month = 12
+        self.converter = EpochConverter(year, last_month)
 
-    def parse_line(self, line, line_type):
-        line_as_array = line.strip().split()
-        try:
-            job_id = line_as_array[1].split("(")[1].split(")")[0]
-            job_month = line_as_array[2].split("/")[0]
-            job_day = line_as_array[2].split("/")[1]
-            job_time = line_as_array[3]
-            job_timestamp = time.strptime("2012-%s-%s %s" % (job_month, job_day, job_time),"%Y-%m-%d %H:%M:%S")
-            condor_job = CondorJob()
+    def parse_line(self, line):
+        """ Records the event on the line (if it is a submit, execute or terminate event) """
 
-            if line_type == "submitted":
-                condor_job.submitted_time = job_timestamp
-            elif line_type == "executing":
-                condor_job.scheduled_time = job_timestamp
-            elif line_type == "terminated":
-                condor_job.terminated_time = job_timestamp
-            condor_job.id = job_id
-            return condor_job
-        except :
-            pass
+        if not line[:4] in EVENT_PREFIXES:
+            return
+        match = EVENT_PATTERN.match(line)
+        if not match:
+            return
+        event, job_id, month, day, hour, minute, second = match.groups()
+        timestamp = self.converter.convert(int(month), int(day), int(hour), int(minute), int(second))
 
-    def store_job(self, condor_job):
-        if not condor_job.id in self.condor_jobs_db:
-            self.condor_jobs_db[condor_job.id] = condor_job
+        condor_job = self.condor_jobs_db.get(job_id)
+        if condor_job == None:
+            condor_job = CondorJob(job_id)
+            self.condor_jobs_db[job_id] = condor_job
 
-        stored_job = self.condor_jobs_db[condor_job.id]
+        # Only the first event of each type counts
+        if event == EVENT_SUBMITTED:
+            if condor_job.submitted_time == None:
+                condor_job.submitted_time = timestamp
+        elif event == EVENT_EXECUTING:
+            if condor_job.scheduled_time == None:
+                condor_job.scheduled_time = timestamp
+        elif condor_job.terminated_time == None:
+            condor_job.terminated_time = timestamp
 
-        if not stored_job.submitted_time and condor_job.submitted_time:
-            self.condor_jobs_db[stored_job.id].submitted_time = condor_job.submitted_time
+    def parse_file(self, processes=1):
+        """ Parses the whole log; with processes other than 1 the log is split into chunks parsed in a process
+        pool (processes=None: one per core) """
 
-        elif not stored_job.scheduled_time and condor_job.scheduled_time:
-            self.condor_jobs_db[stored_job.id].scheduled_time = condor_job.scheduled_time
+        if processes == None:
+            processes = multiprocessing.cpu_count()
+        if processes > 1 and os.path.getsize(self.condor_logfile) >= MIN_CHUNK_SIZE:
+            self.parse_parallel(processes)
+            return
+        with open(self.condor_logfile) as file_obj:
+            for log_line in file_obj:
+                self.parse_line(log_line)
+
+    def parse_range(self, start, end):
+        """ Parses the lines that begin in the byte range [start, end) of the log """
+
+        with open(self.condor_logfile) as file_obj:
+            file_obj.seek(start)
+            position = start
+            while position < end:
+                log_line = file_obj.readline()
+                if not log_line:
+                    break
+                position += len(log_line)
+                self.parse_line(log_line)
 
-        elif not stored_job.terminated_time and condor_job.terminated_time:
-            self.condor_jobs_db[stored_job.id].terminated_time = condor_job.terminated_time
+    def parse_incremental(self, processes=1):
+        """ Parses the part of the log appended since the last call (the whole log the first time)
 
+        The byte offset reached, the jobs parsed so far and a checksum of the parsed prefix are saved next to
+        the log (CHECKPOINT_SUFFIX). Only complete event records are parsed; if the prefix does not match the
+        checksum (the log was rewritten), the log is parsed from the beginning
+        """
 
-    def parse_file(self):
+        offset = self.load_checkpoint()
         with open(self.condor_logfile) as file_obj:
-            condor_job = None
-            for log_line in file_obj:
-                if log_line.find("Job submitted from") != -1:
-                    condor_job = self.parse_line(log_line, "submitted")
+            end = records_end(file_obj, offset, os.path.getsize(self.condor_logfile))
+            if end > offset:
+                if processes == None:
+                    processes = multiprocessing.cpu_count()
+                if processes > 1 and end - offset >= MIN_CHUNK_SIZE:
+                    self.parse_parallel(processes, offset, end)
+                else:
+                    self.parse_range(offset, end)
+            checksum = prefix_checksum(file_obj, end)
+        self.save_checkpoint(end, checksum)
+
+    def get_checkpoint_file(self):
+        return "%s%s" % (self.condor_logfile, CHECKPOINT_SUFFIX)
+
+    def load_checkpoint(self):
+        """ Restores the jobs from the checkpoint if it is valid for the log; returns the offset to continue from """
 
-                elif log_line.find("Job executing on") != -1:
-                    condor_job = self.parse_line(log_line, "executing")
+        self.condor_jobs_db = {}
+        try:
+            with open(self.get_checkpoint_file(), 'rb') as file_obj:
+                checkpoint = cPickle.load(file_obj)
+            if checkpoint["version"] != CHECKPOINT_VERSION:
+                return 0
+            offset = checkpoint["offset"]
+            if offset > os.path.getsize(self.condor_logfile):
+                return 0
+            with open(self.condor_logfile) as file_obj:
+                if prefix_checksum(file_obj, offset) != checkpoint["checksum"]:
+                    return 0
+            jobs = checkpoint["jobs"]
+        except (IOError, OSError, EOFError, cPickle.UnpicklingError, KeyError, TypeError, ValueError):
+            return 0
+        for job_id, submitted_time, scheduled_time, terminated_time in jobs:
+            self.merge_job(job_id, submitted_time, scheduled_time, terminated_time)
+        return offset
 
-                elif log_line.find("Job terminated.") != -1:
-                    condor_job = self.parse_line(log_line, "terminated")
+    def save_checkpoint(self, offset, checksum):
+        """ Writes the checkpoint atomically (a temporary file is renamed over the previous one) """
 
-                if condor_job:
-                    self.store_job(condor_job)
+        checkpoint = {
+            "version": CHECKPOINT_VERSION,
+            "offset": offset,
+            "checksum": checksum,
+            "jobs": [(job_id, condor_job.submitted_time, condor_job.scheduled_time, condor_job.terminated_time)
+                     for job_id, condor_job in self.condor_jobs_db.iteritems()],
+        }
+        checkpoint_file = self.get_checkpoint_file()
+        temp_file = "%s.tmp" % (checkpoint_file)
+        with open(temp_file, 'wb') as file_obj:
+            cPickle.dump(checkpoint, file_obj, cPickle.HIGHEST_PROTOCOL)
+        os.rename(temp_file, checkpoint_file)
+
+    def parse_parallel(self, processes, start=0, end=None):
+        chunks = find_chunks(self.condor_logfile, processes, start, end)
+        tasks = [(self.condor_logfile, chunk_start, chunk_end, self.converter.year, self.converter.last_month)
+                 for chunk_start, chunk_end in chunks]
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(parse_chunk, tasks)
+        finally:
+            pool.close()
+            pool.join()
+        # Chunks are merged in file order, so the first event of each type seen in the file wins
+        for records in results:
+            for job_id, submitted_time, scheduled_time, terminated_time in records:
+                self.merge_job(job_id, submitted_time, scheduled_time, terminated_time)
+
+    def merge_job(self, job_id, submitted_time, scheduled_time, terminated_time):
+        condor_job = self.condor_jobs_db.get(job_id)
+        if condor_job == None:
+            condor_job = CondorJob(job_id)
+            self.condor_jobs_db[job_id] = condor_job
+        if condor_job.submitted_time == None:
+            condor_job.submitted_time = submitted_time
+        if condor_job.scheduled_time == None:
+            condor_job.scheduled_time = scheduled_time
+        if condor_job.terminated_time == None:
+            condor_job.terminated_time = terminated_time
+
+    def to_array(self):
+        """ Returns parsed jobs as a structured numpy array (JOB_DTYPE) ordered by job id """
+
+        jobs = numpy.empty(len(self.condor_jobs_db), dtype=JOB_DTYPE)
+        for index, job_id in enumerate(sorted(self.condor_jobs_db)):
+            condor_job = self.condor_jobs_db[job_id]
+            jobs[index] = (job_id, or_missing(condor_job.submitted_time), or_missing(condor_job.scheduled_time),
+                           or_missing(condor_job.terminated_time))
+        return jobs
 
     def show(self):
         for job_id, condor_job in self.condor_jobs_db.iteritems():
             print condor_job
 
     def create_submitfile(self, dest_file):
-        template = "Universe = vanilla\nExecutable = sleep\nLog = sleep.log\nOutput = sleep.out\nError = sleep.error\n"
         with open(dest_file, 'w') as file_obj:
-            file_obj.write(template)
+            file_obj.write(submit_header())
             for condor_jobs in self.condor_jobs_db.values():
-                elapsed_time = time.mktime(condor_jobs.terminated_time) - time.mktime(condor_jobs.scheduled_time)
+                elapsed_time = condor_jobs.terminated_time - condor_jobs.scheduled_time
                 file_obj.write("Arguments = %d\nQueue\n" % (int(elapsed_time)))
 
+    def iter_trace(self):
+        """ Yields (job, runtime, sleep time before the next submission) for completed jobs in the order of
+        submission (ties by job id); the sleep time after the last job is LAST_JOB_SLEEP """
+
+        completed_jobs = [condor_job for condor_job in self.condor_jobs_db.itervalues()
+                          if condor_job.submitted_time != None and condor_job.scheduled_time != None
+                          and condor_job.terminated_time != None]
+        completed_jobs.sort(key=lambda condor_job: (condor_job.submitted_time, condor_job.id))
+        for index, condor_job in enumerate(completed_jobs):
+            if index == len(completed_jobs) - 1:
+                sleep_time = LAST_JOB_SLEEP
+            else:
+                sleep_time = completed_jobs[index + 1].submitted_time - condor_job.submitted_time
+            yield condor_job, condor_job.terminated_time - condor_job.scheduled_time, sleep_time
+
     def create_submitfiles(self, dest_file_suffix):
 
-        sorted_sub_time = sorted([ x.submitted_time for x in self.condor_jobs_db.values() ])
-
-        template = "Universe = vanilla\nExecutable = sleep\nLog = sleep.log\nOutput = sleep.out\nError = sleep.error\n"
-
-        last_job_index = len(sorted_sub_time) - 1
-
-        for index in range(len(sorted_sub_time)):
-            each = sorted_sub_time[index]
-            for job_id, condor_job in self.condor_jobs_db.iteritems():
-                if each == condor_job.submitted_time:
-                    index_str = str(index)
-                    file_name = "%s%s" % (index_str.zfill(5), dest_file_suffix)
-                    with open(file_name, 'w') as file_obj:
-                        file_obj.write(template)
-                        elapsed_time = time.mktime(condor_job.terminated_time) - time.mktime(condor_job.scheduled_time)
-
-                        #print "Index %d" % index
-                        #print "Last job index %d" % last_job_index
-                        if index == last_job_index:
-                            #sleep_time = 3 * elapsed_time
-                            sleep_time = 120
-                        else:
-                            next_submit_time = sorted_sub_time[index + 1]
-                            submit_time = condor_job.submitted_time
-                            sleep_time = time.mktime(next_submit_time) - time.mktime(submit_time)
-
-                        file_obj.write("Arguments = %d\nQueue\n#SLEEP %d\n" % (int(elapsed_time), int(sleep_time)))
-                    index += 1
-                    print condor_job
-
-# Usage Note :
-log_file = "large.log"
-cp = CondorParser(log_file)
-cp.parse_file()
-cp.show()
-cp.create_submitfile("condor.submit")
-
-# log_file = "gradual.log"
-# cp = CondorParser(log_file)
-# cp.parse_file()
-# cp.show()
-# cp.create_submitfiles(".submit")
+        for index, (condor_job, elapsed_time, sleep_time) in enumerate(self.iter_trace()):
+            file_name = "%s%s" % (str(index).zfill(5), dest_file_suffix)
+            with open(file_name, 'w') as file_obj:
+                file_obj.write(submit_header())
+                file_obj.write("Arguments = %d\nQueue\n#SLEEP %d\n" % (int(elapsed_time), int(sleep_time)))
+            print condor_job
+
+    def create_tracefile(self, dest_file):
+        """ Writes the trace replayed by resources.workload: "<arrival offset> <runtime>" per job """
+
+        offset = 0
+        with open(dest_file, 'w') as file_obj:
+            for condor_job, elapsed_time, sleep_time in self.iter_trace():
+                file_obj.write("%d %d\n" % (offset, elapsed_time))
+                offset += sleep_time
+
+if __name__ == '__main__':
+    # Usage Note :
+    # python log_parser.py large.log [number of processes, 0: one per core]
+    log_file = "large.log"
+    processes = 1
+    if len(sys.argv) > 1:
+        log_file = sys.argv[1]
+    if len(sys.argv) > 2:
+        processes = int(sys.argv[2]) or None
+    cp = CondorParser(log_file)
+    cp.parse_file(processes)
+    # On a log that is still growing: cp.parse_incremental(processes)
+    cp.show()
+    cp.create_submitfile("condor.submit")
+
+    # log_file = "gradual.log"
+    # cp = CondorParser(log_file)
+    # cp.parse_file()
+    # cp.show()
+    # cp.create_submitfiles(".submit")
+    # cp.create_tracefile("gradual.trace")
@@ -0,0 +1,78 @@
+import sys
+
+import numpy
+
+from parsing.log_parser import CondorParser, MISSING_TIME
+
+# Percentiles reported by summary()
+DEFAULT_PERCENTILES = (50, 90, 95, 99)
+
+def completed(jobs):
+    """ Returns the jobs (structured array, see log_parser.JOB_DTYPE) for which all three events were seen """
+
+    mask = (jobs["submitted"] != MISSING_TIME) & (jobs["scheduled"] != MISSING_TIME) & \
+           (jobs["terminated"] != MISSING_TIME)
+    return jobs[mask]
+
+def makespan(jobs):
+    """ Seconds from the first submission to the last termination """
+
+    jobs = completed(jobs)
+    if not len(jobs):
+        return 0
+    return int(jobs["terminated"].max() - jobs["submitted"].min())
+
+def wait_times(jobs):
+    """ Seconds each job spent in the queue before it was scheduled """
+
+    jobs = completed(jobs)
+    return jobs["scheduled"] - jobs["submitted"]
+
+def runtimes(jobs):
+    """ Seconds each job spent executing """
+
+    jobs = completed(jobs)
+    return jobs["terminated"] - jobs["scheduled"]
+
+def percentiles(values, points=DEFAULT_PERCENTILES):
+    """ Returns a dictionary: percentile -> value (empty if there are no values) """
+
+    if not len(values):
+        return {}
+    return dict(zip(points, numpy.percentile(values, points)))
+
+def throughput(jobs, bin_size=3600):
+    """ Number of jobs terminated in each bin_size-second interval from the first submission """
+
+    jobs = completed(jobs)
+    if not len(jobs):
+        return numpy.zeros(0, dtype=numpy.int64)
+    offsets = jobs["terminated"] - jobs["submitted"].min()
+    return numpy.bincount(offsets // bin_size)
+
+def summary(jobs, points=DEFAULT_PERCENTILES):
+    """ Returns a list of lines describing the experiment """
+
+    done = completed(jobs)
+    lines = []
+    lines.append("Jobs parsed: %d, completed: %d" % (len(jobs), len(done)))
+    if not len(done):
+        return lines
+    span = makespan(done)
+    lines.append("Makespan: %d sec" % (span))
+    for name, values in (("Wait time", wait_times(done)), ("Runtime", runtimes(done))):
+        lines.append("%s: mean %.1f sec, min %d sec, max %d sec" % (name, values.mean(), values.min(), values.max()))
+        for point, value in sorted(percentiles(values, points).items()):
+            lines.append("%s: %dth percentile %.1f sec" % (name, point, value))
+    if span > 0:
+        lines.append("Throughput: %.3f jobs/hour" % (len(done) * 3600.0 / span))
+    return lines
+
+
+if __name__ == '__main__':
+    # Usage Note :
+    # python -m parsing.metrics log/<experiment id>/sleep.log
+    cp = CondorParser(sys.argv[1])
+    cp.parse_file()
+    for line in summary(cp.to_array()):
+        print line
@@ -1,62 +1,88 @@
+import itertools
 import random
 
-def parse_file(file_name, limit):
-    if not limit:
-        return None
+from optparse import OptionParser
+from submit import submit_header
+
+def iter_runtimes(file_name, limit=None):
+    """ Yields runtimes (one integer per line) from the file, at most limit of them (all if limit is None) """
+
     with open(file_name) as file_obj:
-        count = 0
-        jlist = []
-        for log_line in file_obj:
-            #print int(log_line)
-            jlist.append(int(log_line))
-            count += 1
-            if count == limit:
+        for log_line in itertools.islice(file_obj, limit):
+            if log_line.strip():
+                yield int(log_line)
+
+def mix(streams, seed=None):
+    """ Yields elements of the iterators in streams, a list of (iterator, weight) pairs, in random order
+
+    Each element is taken from one of the streams that are not exhausted yet, chosen with probability
+    proportional to its weight; the order of elements within a stream is preserved. The same seed
+    gives the same mix
+    """
+
+    rand = random.Random(seed)
+    streams = [[iterator, float(weight)] for iterator, weight in streams if weight > 0]
+    total_weight = sum([weight for iterator, weight in streams])
+    while streams:
+        point = rand.random() * total_weight
+        for index, (iterator, weight) in enumerate(streams):
+            point -= weight
+            if point < 0:
                 break
-        return jlist
-
-def mix(list1, list2):
-    if list1:
-        l1 = len(list1)
-    else:
-        l1 = 0
-    if list2:
-        l2 = len(list2)
-    else:
-        l2 = 0
-    capacity = l1 + l2
-    mixed = []
-    #print "Capacity: %d" % capacity
-    for i in range(capacity):
-        if not list1:
-            selection = 2
-        elif not list2:
-            selection = 1
-        else:
-            selection = random.randrange(0,2)
-        element = None
-        if selection == 1:
-            element = list1[0]
-            mixed.append(element)
-            list1.remove(element)
-        else:
-            element = list2[0]
-            mixed.append(element)
-            list2.remove(element)
-        #print "Selecton: %d" % selection
-        #print "Element: %s" % element
-    return mixed
-
-f1 = "small.xls"
-f2 = "large.xls"
-out = "mix.xls"
-f1_limit = 1000
-f2_limit = 
-l1 = parse_file(f1, f1_limit)
-l2 = parse_file(f2, f2_limit)
-m = mix(l1, l2)
-
-template = "Universe = vanilla\nExecutable = sleep\nLog = sleep.log\nOutput = sleep.out\nError = sleep.error\n"
-with open(out, 'w') as file_obj:
-    file_obj.write(template)
-    for elem in m:
-        file_obj.write("Arguments = %d\nQueue\n" % (elem))
\ No newline at end of file
+        try:
+            yield next(iterator)
+        except StopIteration:
+            del streams[index]
+            total_weight = sum([weight for iterator, weight in streams])
+
+def write_submitfile(runtimes, dest_file):
+    """ Writes the submit description with one job per runtime as the runtimes are produced; returns the number of jobs """
+
+    count = 0
+    with open(dest_file, 'w') as file_obj:
+        file_obj.write(submit_header())
+        for runtime in runtimes:
+            file_obj.write("Arguments = %d\nQueue\n" % (runtime))
+            count += 1
+    return count
+
+def parse_stream(argument):
+    """ Parses a stream argument: file[:limit[:weight]] (no limit: whole file, default weight: 1) """
+
+    parts = argument.split(":")
+    limit = None
+    weight = 1.0
+    if len(parts) > 1 and parts[1]:
+        limit = int(parts[1])
+    if len(parts) > 2 and parts[2]:
+        weight = float(parts[2])
+    return parts[0], limit, weight
+
+def parse_mix_options():
+
+    parser = OptionParser(usage="usage: %prog [options] file[:limit[:weight]] ...")
+
+    parser.add_option("-o", "--output", action="store", dest="output",
+        help="Location of the submit file to write (default: mix.xls).")
+    parser.set_defaults(output="mix.xls")
+
+    parser.add_option("-s", "--seed", action="store", type="int", dest="seed",
+        help="Seed of the random generator (default: random).")
+    parser.set_defaults(seed=None)
+
+    (options, args) = parser.parse_args()
+    if not args:
+        parser.error("at least one runtime list is required")
+    return (options, args)
+
+
+if __name__ == '__main__':
+    # Usage Note :
+    # python mix.py -o mix.xls -s 1 small.xls:1000 large.xls
+    (options, args) = parse_mix_options()
+    streams = []
+    for argument in args:
+        file_name, limit, weight = parse_stream(argument)
+        streams.append((iter_runtimes(file_name, limit), weight))
+    count = write_submitfile(mix(streams, options.seed), options.output)
+    print "%d jobs written to %s" % (count, options.output)
@@ -0,0 +1,10 @@
+# Condor user log of the jobs (default), relative to the directory condor_submit runs in
+DEFAULT_LOG = "sleep.log"
+
+# Part of every submit description that is the same for all jobs
+SUBMIT_TEMPLATE = "Universe = vanilla\nExecutable = sleep\nLog = %s\nOutput = sleep.out\nError = sleep.error\n"
+
+def submit_header(log_file=DEFAULT_LOG):
+    """ Returns the common part of a submit description, with the jobs logging to log_file """
+
+    return SUBMIT_TEMPLATE % (log_file)
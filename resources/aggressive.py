@@ -1,37 +1,44 @@
+import heapq
 import logging
-import copy
 import operator
 import time
 
 from threading import Thread
 from resources.jobs import Jobs
+from resources.snapshot import ClusterSnapshot
+from resources.rebalance import plan_rebalance
 from lib.logger import filelog
-from resources.workers import Worker
+from lib.util import format_runtime
+from resources.workerops import WorkerOperations, count_terminated
 
 
 LOG = logging.getLogger(__name__)
 
 class AggressiveDownscaler(Thread):
 
-    def __init__(self, stop_event, config, master, phantom_client, interval=120):
+    def __init__(self, stop_event, config, master, phantom_client, interval=120, poller=None):
 
         Thread.__init__(self)
         self.stop_event = stop_event
         self.config = config
         self.master = master
         self.interval = interval
+        self.poller = poller
         self.get_desired_dict()
         self.phantom_client = phantom_client
 
     def run(self):
 
         LOG.info("Activating AD. Sleep period: %d sec" % (self.interval))
-        jobs = Jobs(self.config, self.master.dns)
+        jobs = Jobs(self.config, self.master.dns, self.poller)
+        worker_ops = WorkerOperations(self.config, self.master.dns, self.phantom_client,
+                                      self.config.policy.worker_parallelism)
         while(not self.stop_event.is_set()):
             self.stop_event.wait(self.interval)
 
-            curr_dict = self.get_current_dict()
-            jobs.update_current_list()
+            # All remote reads of this iteration happen here
+            snapshot = ClusterSnapshot.take(self.config, self.phantom_client, jobs)
+            curr_dict = self.get_current_dict(snapshot)
 
             pool_dict_str = "%s," % (time.time())
             for cloud_name, instance_count in curr_dict.iteritems():
@@ -45,11 +52,12 @@ class AggressiveDownscaler(Thread):
                 up_diff =  self.desired_dict[cloud_name] - curr_dict[cloud_name]
                 diff_dict[cloud_name] = up_diff
 
+            victims = []
             for cloud_name in curr_dict:
                 if curr_dict[cloud_name] > self.desired_dict[cloud_name]:
                     LOG.info("Downscaling in %s" % (cloud_name))
                     down_diff = - diff_dict[cloud_name]
-                    candidates = self.get_cloud_instances_by_runtime_inc(cloud_name, jobs)
+                    candidates = self.get_cloud_instances_with_runtime(cloud_name, snapshot)
                     termination_list = self.select_from_candidates(cloud_name, candidates, down_diff)
                     for atuple in termination_list:
                         instance_id = atuple[0]
@@ -59,60 +67,20 @@ class AggressiveDownscaler(Thread):
                         dns = instance_info['public_dns']
 
                         LOG.info("AD terminated instance %s in %s" % (cloud_name, instance_id))
-                        filelog(self.config.discarded_work_log, "DISCARDED,%s,%s,%s" % (cloud_name, dns, running))
+                        filelog(self.config.discarded_work_log, "DISCARDED,%s,%s,%s" % (cloud_name, dns, format_runtime(running)))
                         filelog(self.config.node_log, "TERMINATED WORKER cloud: %s, instance: %s, dns: %s"
                                                       % (cloud_name, instance_id, dns))
+                        victims.append((cloud_name, instance_id, instance_info))
 
-                        LOG.info("Desired capacity (before termination) is %d" % (self.phantom_client.asg.desired_capacity))
-                        Worker(self.config, instance_id, instance_info).terminate_condor(self.master.dns)
-                        self.phantom_client.terminate_instance(instance_id)
-                        LOG.info("Desired capacity (after termination) is %d" % (self.phantom_client.asg.desired_capacity))
-
-                        # figure out where to up scale
-
-                        # sort the diff dict to find cloud with max number of lack isntances ( up scale )
-                        # [('c', 10), ('a', 3), ('b', 1)]
-                        # we sort dict by value, it returns list of tuples
-                        sorted_diff_dict = sorted(diff_dict.iteritems(), key=operator.itemgetter(1), reverse=True)
-                        if sorted_diff_dict[0][1] > 0:
-                            cloud_to_upscale = sorted_diff_dict[0][0]
-
-
-                            if cloud_to_upscale != cloud_name:
-                                # create new tag :
-                                current_cloud_tag = self.phantom_client.cloud_list.split(",")
-                                new_cloud_tag = ""
-                                new_cloud_count = 0
-                                LOG.info("Current cloud tag is %s" % (self.phantom_client.cloud_list))
-                                LOG.info("Current dict is %s" % (str(curr_dict)))
-                                LOG.info("Diff dict is %s" % (str(diff_dict)))
-                                for each_cloud in current_cloud_tag:
-                                    tmp_cloud_name = each_cloud.split(":")[0]
-                                    tmp_cloud_count = int(each_cloud.split(":")[1])
-                                    if tmp_cloud_name == cloud_to_upscale:
-                                        new_cloud_tag += "%s:%d," % (tmp_cloud_name, tmp_cloud_count +1)
-                                        curr_dict[tmp_cloud_name] += 1
-                                        diff_dict[tmp_cloud_name] -= 1
-                                    elif tmp_cloud_name == cloud_name:
-                                        new_cloud_tag += "%s:%d," % (tmp_cloud_name, tmp_cloud_count - 1)
-                                        curr_dict[tmp_cloud_name] -= 1
-                                        diff_dict[tmp_cloud_name] += 1
-                                    else:
-                                        new_cloud_tag += "%s:%d," % (tmp_cloud_name, tmp_cloud_count)
-                                    new_cloud_count += curr_dict[tmp_cloud_name]
-
-                                new_cloud_tag_no_comma = new_cloud_tag[:-1]
-                                LOG.info("New cloud tag is %s" % (new_cloud_tag_no_comma))
-                                LOG.info("New Current dict is %s" % (str(curr_dict)))
-                                LOG.info("New Diff dict is %s" % (str(diff_dict)))
-                                LOG.info("New Desired capacity (after recounting) is %d" % (new_cloud_count))
-
-                                self.phantom_client.update_tags(new_cloud_tag_no_comma, new_cloud_count)
-                                self.phantom_client.cloud_list = new_cloud_tag_no_comma
-                                self.phantom_client.asg.set_capacity(new_cloud_count)
-                            else:
-                                LOG.info("Trying to upscale and downscale in the same cloud .. STOPPED")
+            # Victims of all clouds are terminated concurrently
+            LOG.info("Desired capacity (before termination) is %d" % (self.phantom_client.asg.desired_capacity))
+            terminated_dict = count_terminated(worker_ops.terminate(victims))
+            LOG.info("Desired capacity (after termination) is %d" % (self.phantom_client.asg.desired_capacity))
 
+            # Replace terminated instances in the clouds that lack instances: one Phantom update per iteration
+            plan = plan_rebalance(self.phantom_client.cloud_list, curr_dict, self.desired_dict, terminated_dict)
+            if plan:
+                self.phantom_client.apply_rebalance(plan)
 
     def get_desired_dict(self):
         # assigns both the total count and the desired dict (by cloud)
@@ -123,58 +91,33 @@ class AggressiveDownscaler(Thread):
         LOG.info("AD determined desired dictionary: %s" % (str(self.desired_dict)))
         return
 
-    def get_current_dict(self):
+    def get_current_dict(self, snapshot):
 
-
-        pool_dict = {}
-        asg_info = self.phantom_client.get_autoscale_groups_info(self.phantom_client.asg.name)
-        all_instances_info = asg_info[self.phantom_client.asg.name]['instances']
-        instances_info = self.phantom_client.get_alive_instnaces(all_instances_info)
-
-        for acloud in self.config.clouds.list:
-            pool_dict[acloud] = 0
-            for instance_id in instances_info:
-                if instances_info[instance_id]['cloud_name'] == acloud:
-                    pool_dict[acloud] += 1
+        pool_dict = snapshot.get_current_dict()
         LOG.info("AD found current instance dictionary: %s" % (str(pool_dict)))
 
-
         return pool_dict
 
 
-    def get_cloud_instances_by_runtime_inc(self, cloud_name, jobs):
-        """ Return instances in the cloud sorted by the time they have been running their jobs (increasing order) """
-
-        asg_info = self.phantom_client.get_autoscale_groups_info(self.phantom_client.asg.name)
-        all_instances_info = asg_info[self.phantom_client.asg.name]['instances']
-        instances = self.phantom_client.get_alive_instnaces(all_instances_info)
-
-        localjobs = copy.copy(jobs)
-
-
-        instances_by_runtime = []
-        for instance in instances:
-            if instances[instance]['cloud_name'] != cloud_name:
-                continue
-            job_matching_found = False
-            for job in localjobs.list:
-                if instances[instance]['public_dns'] == job.node:
-                    instances_by_runtime.append( (instance, job.running, instances[instance]) )
-                    localjobs.list.remove(job)
-                    job_matching_found = True
-                    break
-            if not job_matching_found:
-                instances_by_runtime.append( (instance, "0", instances[instance]) )
+    def get_cloud_instances_with_runtime(self, cloud_name, snapshot):
+        """ Return instances in the cloud with the time (sec) they have been running their jobs (0 for idle ones);
+        the list is not sorted, select_from_candidates picks the shortest runtimes """
 
-        sorted_instances_by_runtime = sorted(instances_by_runtime, key=operator.itemgetter(1))
+        instances_with_runtime = []
+        for instance, instance_info in snapshot.get_cloud_instances(cloud_name):
+            node_jobs = snapshot.get_node_jobs(instance_info['public_dns'])
+            if node_jobs:
+                instances_with_runtime.append( (instance, node_jobs[0].runtime, instance_info) )
+            else:
+                instances_with_runtime.append( (instance, 0, instance_info) )
 
         # Logging
-        sorted_list_str = ""
-        for atuple in sorted_instances_by_runtime:
-            sorted_list_str += "%s:%s," % (atuple[0], atuple[1])
-        LOG.info("AD found candidates for termination in %s: %s" % (cloud_name, sorted_list_str))
+        list_str = ""
+        for atuple in instances_with_runtime:
+            list_str += "%s:%s," % (atuple[0], format_runtime(atuple[1]))
+        LOG.info("AD found candidates for termination in %s: %s" % (cloud_name, list_str))
 
-        return sorted_instances_by_runtime
+        return instances_with_runtime
 
     def select_from_candidates(self, cloud_name, candidates, count_needed):
         """
@@ -192,8 +135,8 @@ class AggressiveDownscaler(Thread):
             LOG.info("AD: selecting %d out of %d instances for termination in %s. Not enough candidates"
                      % (count_needed, len(candidates), cloud_name))
 
-        # Truncate if needed (in cases  when count_needed < len(candidates)
-        first_stage_candidates = candidates[:count_needed]
+        # count_needed candidates with the shortest runtimes, in increasing order: O(n log k)
+        first_stage_candidates = heapq.nsmallest(count_needed, candidates, key=operator.itemgetter(1))
 
         # Select candidates with less than threshold amount of work accomplished
         second_stage_candidates = []
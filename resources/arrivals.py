@@ -0,0 +1,74 @@
+import logging
+import time
+
+LOG = logging.getLogger(__name__)
+
+class ArrivalScheduler(object):
+    """ ArrivalScheduler class keeps a workload replay on the original arrival times
+
+    Every job has an absolute deadline: start time + its arrival offset in the trace. The replay sleeps until
+    the next deadline (instead of sleeping for the gap after each submission), so the time spent submitting
+    does not accumulate. Jobs whose deadline has already passed are overdue and are submitted right away.
+    The lag (achieved - intended arrival) of every submitted job is kept for lag_summary; jobs whose submission
+    failed are only counted
+
+    """
+    def __init__(self, start_time=None):
+        if start_time == None:
+            start_time = time.time()
+        self.start_time = start_time
+        self.lags = []
+        self.failures = 0
+
+    def deadline(self, offset):
+        return self.start_time + offset
+
+    def is_overdue(self, offset, now=None):
+        if now == None:
+            now = time.time()
+        return self.deadline(offset) <= now
+
+    def wait(self, offset):
+        """ Sleeps until the deadline of the arrival offset (returns right away if it has passed) """
+
+        delay = self.deadline(offset) - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def record(self, offset, achieved):
+        """ Records the achieved arrival time of a job, returns its lag in seconds """
+
+        lag = achieved - self.deadline(offset)
+        self.lags.append(lag)
+        return lag
+
+    def record_failure(self, offset):
+        """ Records a job whose submission failed; it has no achieved arrival time """
+
+        self.failures += 1
+
+    def lag_summary(self):
+        """ Returns a dictionary with statistics of the recorded lags (sec): count, mean, median, p95, max,
+        and the number of failed submissions """
+
+        summary = {"count": len(self.lags), "mean": 0.0, "median": 0.0, "p95": 0.0, "max": 0.0,
+                   "failed": self.failures}
+        if not self.lags:
+            return summary
+        lags = sorted(self.lags)
+        summary["mean"] = sum(lags) / len(lags)
+        summary["median"] = percentile(lags, 50)
+        summary["p95"] = percentile(lags, 95)
+        summary["max"] = lags[-1]
+        return summary
+
+def percentile(sorted_values, point):
+    """ Percentile of a sorted, non-empty list: the value at the closest rank """
+
+    rank = int(round(point / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[rank]
+
+def format_lag_summary(summary):
+    return "count %d, mean %.3f, median %.3f, p95 %.3f, max %.3f, failed %d" \
+           % (summary["count"], summary["mean"], summary["median"], summary["p95"], summary["max"],
+              summary["failed"])
@@ -1,6 +1,8 @@
 import logging
 import os
+import time
 
+from threading import Thread
 from boto.ec2.connection import EC2Connection
 from boto.ec2.regioninfo import RegionInfo
 
@@ -8,6 +10,34 @@ from lib.util import is_yes, printfile
 
 LOG = logging.getLogger(__name__)
 
+# Seconds an inventory snapshot is reused before the cloud is listed again
+DEFAULT_INVENTORY_TTL = 30
+
+class CloudInventory(object):
+    """ CloudInventory class is a snapshot of all instances in a cloud obtained with a single listing
+
+    Instances are indexed by id, public DNS name and state, reservations are indexed by id
+
+    """
+    def __init__(self, reservations):
+        self.timestamp = time.time()
+        self.list = []
+        self.reservations = {}
+        self.by_id = {}
+        self.by_dns = {}
+        self.by_state = {}
+        for reservation in reservations:
+            self.reservations[reservation.id] = reservation
+            for instance in reservation.instances:
+                self.list.append(instance)
+                self.by_id[instance.id] = instance
+                if instance.public_dns_name:
+                    self.by_dns[instance.public_dns_name] = instance
+                self.by_state.setdefault(instance.state, []).append(instance)
+
+    def age(self):
+        return time.time() - self.timestamp
+
 class Cloud(object):
     """ Cloud class provides functionality for connecting to a specified cloud and launching an instance there
 
@@ -25,6 +55,11 @@ class Cloud(object):
         self.secret_var = self.cloud_config.get(self.name, "secret_key").strip('$')
         self.access_id = os.environ[self.access_var]
         self.secret_key = os.environ[self.secret_var]
+        if self.cloud_config.has_option(self.name, "inventory_ttl"):
+            self.inventory_ttl = float(self.cloud_config.get(self.name, "inventory_ttl"))
+        else:
+            self.inventory_ttl = DEFAULT_INVENTORY_TTL
+        self.inventory = None
         self.conn = None
 
     def connect(self):
@@ -68,90 +103,75 @@ class Cloud(object):
         boot_result = image_object.run(user_data=user_data, key_name=self.config.globals.key_name,
             min_count=count, max_count=count, instance_type=type)
         LOG.info("Attempted to boot instance(s). Result: %s" % (boot_result))
+        self.invalidate_inventory()
         return boot_result
 
-    def get_instances(self, exclude_dns=None):
-        instances_list = []
+    def get_inventory(self, refresh=False):
+        """ Returns the inventory snapshot of this cloud; lists instances again only if the snapshot
+        is older than inventory_ttl seconds or refresh is requested """
+
         if self.conn == None:
             self.connect()
 
-        all_reservations = self.conn.get_all_instances()
-        for reservation in all_reservations:
-            for instance in reservation.instances:
-                if not ((exclude_dns) and (instance.public_dns_name == exclude_dns)):
-                    instances_list.append(instance)
-        return instances_list
+        if refresh or self.inventory == None or self.inventory.age() > self.inventory_ttl:
+            self.inventory = CloudInventory(self.conn.get_all_instances())
+        return self.inventory
 
-    def get_instance_by_id(self, instance_id):
-        instances_list = []
-        if self.conn == None:
-            self.connect()
-        all_reservations = self.conn.get_all_instances()
-        for reservation in all_reservations:
-            for instance in reservation.instances:
-                if instance_id == instance.id:
-                    return instance
+    def invalidate_inventory(self):
+        """ Drops the inventory snapshot; the next query lists instances again """
 
-    def get_running_instances(self):
-        instances_list = []
-        if self.conn == None:
-            self.connect()
+        self.inventory = None
 
-        all_reservations = self.conn.get_all_instances()
-        for reservation in all_reservations:
-            for instance in reservation.instances:
-                if instance.state == "running":
-                    instances_list.append(instance)
+    def get_instances(self, exclude_dns=None):
+        instances_list = []
+        for instance in self.get_inventory().list:
+            if not ((exclude_dns) and (instance.public_dns_name == exclude_dns)):
+                instances_list.append(instance)
         return instances_list
 
-    def get_pending_instances(self):
-        instances_list = []
-        if self.conn == None:
-            self.connect()
+    def get_instance_by_id(self, instance_id):
+        return self.get_inventory().by_id.get(instance_id)
 
-        all_reservations = self.conn.get_all_instances()
-        for reservation in all_reservations:
-            for instance in reservation.instances:
-                if instance.state == "pending":
-                    instances_list.append(instance)
-        return instances_list
+    def get_instance_by_dns(self, dns):
+        return self.get_inventory().by_dns.get(dns)
+
+    def get_running_instances(self):
+        return list(self.get_inventory().by_state.get("running", []))
 
+    def get_pending_instances(self):
+        return list(self.get_inventory().by_state.get("pending", []))
 
     def terminate_instance(self, instance_id):
-        if self.conn == None:
-            self.connect()
-
-        all_reservations = self.conn.get_all_instances()
-        for reservation in all_reservations:
-            for instance in reservation.instances:
-                if instance.id == instance_id:
-                    instance.terminate()
-                    return True
-        return False
+        instance = self.get_instance_by_id(instance_id)
+        if instance == None:
+            return False
+        instance.terminate()
+        # Terminated instance changes its state, get a fresh snapshot
+        self.get_inventory(refresh=True)
+        return True
 
     def is_reservation_ready(self, checked_reservation):
 
-        all_reservations = self.conn.get_all_instances()
-        for reservation in all_reservations:
-            if reservation.id == checked_reservation.id:
-                for instance in reservation.instances:
-                    if instance.state == "running":
-                        LOG.info("Instance \"%s\" of reservation \"%s\" is running" % (instance.id, reservation.id))
-                    else:
-                        return False
+        # Called in a wait loop, so always look at the current state of the cloud
+        reservation = self.get_inventory(refresh=True).reservations.get(checked_reservation.id)
+        if reservation:
+            for instance in reservation.instances:
+                if instance.state == "running":
+                    LOG.info("Instance \"%s\" of reservation \"%s\" is running" % (instance.id, reservation.id))
+                else:
+                    return False
         return True
 
     def terminate_all_but_running_instances(self):
 
-        if self.conn == None:
-            self.connect()
-
-        all_reservations = self.conn.get_all_instances()
-        for reservation in all_reservations:
-            for instance in reservation.instances:
-                if not (instance.state == "running"):
-                    LOG.info("Instance %s in cloud %d isn't running. Terminating it" % (self.name, instance.id))
-                    instance.terminate()
+        terminated = False
+        for instance in self.get_inventory(refresh=True).list:
+            if not (instance.state == "running"):
+                LOG.info("Instance %s in cloud %s isn't running. Terminating it" % (instance.id, self.name))
+                instance.terminate()
+                terminated = True
+        if terminated:
+            self.invalidate_inventory()
 
 
 class Clouds(object):
@@ -177,6 +197,40 @@ class Clouds(object):
             if cloud.get_instance_by_id(instance_id):
                 return cloud
 
+    def get_inventories(self, refresh=False):
+        """ Obtains inventories of all clouds in parallel, one listing per cloud
+
+        Returns a dictionary: cloud name -> CloudInventory; clouds that could not be listed are left out
+        """
+
+        inventories = {}
+
+        def fetch(cloud):
+            try:
+                inventories[cloud.name] = cloud.get_inventory(refresh)
+            except Exception as ex:
+                LOG.error("Can't obtain the list of instances in cloud %s: %s" % (cloud.name, str(ex)))
+
+        threads = []
+        for cloud in self.list:
+            thread = Thread(target=fetch, args=(cloud,))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        return inventories
+
+    def index_instances(self, refresh=False):
+        """ Returns a dictionary: instance id -> (cloud, instance) for the instances in all clouds """
+
+        inventories = self.get_inventories(refresh)
+        index = {}
+        for cloud in self.list:
+            if cloud.name in inventories:
+                for instance_id, instance in inventories[cloud.name].by_id.iteritems():
+                    index[instance_id] = (cloud, instance)
+        return index
+
     def selected_terminate(self):
 
         #terminate = raw_input( "Would you like to terminate running instances now? (Y/N)\n" )
@@ -213,6 +267,7 @@ class Clouds(object):
 
             for cloud in self.list:
                 cloud.conn = None
+                cloud.invalidate_inventory()
 
     def log_instance_distribution(self):
 
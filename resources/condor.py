@@ -0,0 +1,242 @@
+import logging
+import time
+
+from threading import Thread, Event, Condition
+from lib.util import RemoteCommand
+from resources.jobs import JobTable, job_query_command
+
+LOG = logging.getLogger(__name__)
+
+# Seconds between two polls of the master
+DEFAULT_POLL_INTERVAL = 30
+
+# condor_off modes: jobs are killed (fast) or finish first and no new ones are accepted (peaceful)
+CONDOR_OFF_FAST = "fast"
+CONDOR_OFF_PEACEFUL = "peaceful"
+# Hosts given to one condor_off command
+MAX_HOSTS_PER_COMMAND = 100
+
+class CondorWorker(object):
+
+    def __init__(self, name, state, activity):
+
+        self.name = name
+        self.state = state
+        self.activity = activity
+
+def parse_condor_status(output):
+    """ Parses the output of condor_status into a list of workers (one per line of interest) """
+
+    workers = []
+    if output:
+        # condor status will be lines so split them
+        for line in output.split("\n"):
+            # line not empty
+            if line.strip():
+                # if its the first line then go to the next one
+                if line.strip().startswith("Name"):
+                    continue
+                # if we find a line that starts with total then we are done, break out from the loop
+                elif line.strip().startswith("Total"):
+                    break
+                # it must be a line of interest, parse it
+                else:
+                    # split line by space :
+                    #"vm-148-102.uc.futu LINUX      X86_64 Unclaimed Idle     0.150  2048  0+00:00:04"
+                    line_columns = line.split()
+                    try:
+                        if len(line_columns) > 4:
+                            workers.append(CondorWorker(line_columns[0].strip(), line_columns[3], line_columns[4]))
+                        else:
+                            workers.append(CondorWorker(line_columns[0].strip(), None, None))
+                    except Exception as expt:
+                        LOG.info("Error parsing condor status, line says : %s and the expt says : %s" % (line, str(expt)))
+    return workers
+
+def parse_condor_off(output, hosts):
+    """ Parses the output of condor_off for several hosts; returns a dictionary: host -> True if the command
+    was sent to it
+
+    condor_off prints a line per host: 'Sent "Kill-All-Daemons-Fast" command to master <host>' on success,
+    'Can't find address for master <host>' (or a similar error mentioning the host) on failure. Hosts may be
+    printed by their short names (without the domain); a short name counts only if exactly one of the hosts has it.
+    A host that is not mentioned in any "Sent" line is considered failed
+    """
+
+    sent = {}
+    short_names = {}
+    for host in hosts:
+        sent[host] = False
+        short_name = host.split(".")[0]
+        short_names[short_name] = short_names.get(short_name, 0) + 1
+    if not output:
+        return sent
+    for line in output.split("\n"):
+        line = line.strip()
+        if not line.startswith("Sent "):
+            if line:
+                LOG.info("condor_off: %s" % (line))
+            continue
+        name = line.split()[-1]
+        for host in hosts:
+            if name == host or ("." not in name and short_names.get(name) == 1 and host.split(".")[0] == name):
+                sent[host] = True
+    return sent
+
+
+class CondorAdmin(object):
+    """ CondorAdmin class runs pool administration commands on the master for many workers at once:
+    one condor_off per mode (and per MAX_HOSTS_PER_COMMAND hosts) instead of one per worker """
+
+    def __init__(self, config, master_dns):
+
+        self.config = config
+        self.master_dns = master_dns
+
+    def off(self, mode, hosts):
+        """ Runs condor_off -<mode> for the hosts (public dns names); returns a dictionary: host -> True on success """
+
+        result = {}
+        for first in range(0, len(hosts), MAX_HOSTS_PER_COMMAND):
+            group = hosts[first:first + MAX_HOSTS_PER_COMMAND]
+            rcmd = RemoteCommand(
+                config = self.config,
+                hostname = self.master_dns,
+                ssh_private_key = self.config.globals.priv_path,
+                user = 'root',
+                command = "condor_off -%s %s" % (mode, " ".join(group)))
+            # A non-zero code only means that some of the hosts failed; the output tells which
+            if rcmd.execute() == None:
+                LOG.error("Could not run condor_off -%s on the master for %d hosts" % (mode, len(group)))
+                for host in group:
+                    result[host] = False
+            else:
+                result.update(parse_condor_off(rcmd.stdout, group))
+        for host in hosts:
+            if not result[host]:
+                LOG.error("condor_off -%s failed for %s" % (mode, host))
+        return result
+
+    def off_fast(self, hosts):
+        return self.off(CONDOR_OFF_FAST, hosts)
+
+    def off_peaceful(self, hosts):
+        return self.off(CONDOR_OFF_PEACEFUL, hosts)
+
+
+class CondorSnapshot(object):
+    """ CondorSnapshot class is a read-only view of the pool (job queue and workers) published by CondorPoller """
+
+    def __init__(self, version, job_table, workers):
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "timestamp", time.time())
+        object.__setattr__(self, "job_table", job_table)
+        object.__setattr__(self, "workers", tuple(workers))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CondorSnapshot is read-only")
+
+    def idle_workers_count(self):
+        count = 0
+        for worker in self.workers:
+            if worker.activity == "Idle":
+                count += 1
+        return count
+
+    def worker_names(self):
+        return [worker.name for worker in self.workers]
+
+
+class CondorPoller(Thread):
+    """ CondorPoller thread queries the master (condor_q and condor_status) every interval seconds
+    and publishes the results as versioned snapshots
+
+    Consumers (workload monitor, downscalers, initial monitor, failure simulators) read the latest snapshot
+    or wait for a version newer than the one they have already seen, instead of querying the master themselves
+
+    """
+    def __init__(self, config, master_dns, interval=DEFAULT_POLL_INTERVAL):
+
+        Thread.__init__(self)
+        self.daemon = True
+        self.config = config
+        self.master_dns = master_dns
+        self.interval = interval
+        self.stop_event = Event()
+        self.condition = Condition()
+        self.snapshot = None
+        self.version = 0
+
+        self.command_job_table = job_query_command(self.config.workload.user)
+        self.command_status = "condor_status"
+
+    def run(self):
+
+        LOG.info("Activating Condor poller. Sleep period: %d sec" % (self.interval))
+        while not self.stop_event.is_set():
+            try:
+                self.poll()
+            except Exception as ex:
+                LOG.error("Exception in polling the master: %s" % (str(ex)))
+            self.stop_event.wait(self.interval)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def execute(self, command):
+        rcmd = RemoteCommand(
+            config = self.config,
+            hostname = self.master_dns,
+            ssh_private_key = self.config.globals.priv_path,
+            user = self.config.workload.user,
+            command = command)
+        code = rcmd.execute()
+        if code != 0:
+            return None
+        # Empty output of a successful query is a valid result (e.g. condor_q with no jobs in the queue)
+        return rcmd.stdout or ""
+
+    def poll(self):
+        """ Queries the master and publishes a new snapshot; nothing is published if any of the queries fails """
+
+        job_table_output = self.execute(self.command_job_table)
+        status_output = self.execute(self.command_status)
+        if job_table_output == None or status_output == None:
+            LOG.error("Condor poller could not query the master. Keeping snapshot version %d" % (self.version))
+            return
+
+        job_table = JobTable.parse(job_table_output)
+        workers = parse_condor_status(status_output)
+        with self.condition:
+            self.version += 1
+            self.snapshot = CondorSnapshot(self.version, job_table, workers)
+            self.condition.notify_all()
+
+    def get_snapshot(self):
+        """ Returns the latest snapshot (None if nothing has been published yet) """
+
+        with self.condition:
+            return self.snapshot
+
+    def wait_for_newer(self, version, timeout=None):
+        """ Waits until a snapshot newer than the given version is published and returns it
+
+        Returns None if timeout (in seconds) expires or the poller stops first; the caller should then query
+        the master directly
+        """
+
+        deadline = None
+        if timeout != None:
+            deadline = time.time() + timeout
+        with self.condition:
+            while self.version <= version and not self.stop_event.is_set():
+                if deadline == None:
+                    self.condition.wait(self.interval)
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+            if self.version <= version:
+                return None
+            return self.snapshot
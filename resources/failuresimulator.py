@@ -8,6 +8,7 @@ from resources.clouds import Cloud
 from lib.util import RemoteCommand
 from lib.logger import filelog
 from resources.workers import Worker
+from resources.condor import parse_condor_status
 
 LOG = logging.getLogger(__name__)
 
@@ -16,13 +17,15 @@ class FailureSimulator(Thread):
     Terminate one VM at a time using exponential failure distribution within a given cloud (group specifies this cloud)
     """
 
-    def __init__(self, stop_event, config, master, group):
+    def __init__(self, stop_event, config, master, group, poller=None):
 
         Thread.__init__(self)
         self.stop_event = stop_event
         self.config = config
         self.master = master
         self.group = group
+        self.poller = poller
+        self.version = 0
         random.seed(os.urandom(128))
 
     def run(self):
@@ -63,37 +66,23 @@ class FailureSimulator(Thread):
 
     def get_cloud_termination_list(self):
 
-        condor_list = []
-        command = "condor_status"
-        rcmd = RemoteCommand(
-            config = self.config,
-            hostname = self.master.dns,
-            ssh_private_key = self.config.globals.priv_path,
-            user = self.config.workload.user,
-            command = command)
-        rcmd.execute()
-        if rcmd.stdout:
-            # condor status will be lines so split them
-            all_lines = rcmd.stdout.split("\n")
-            for line in all_lines:
-                # line not empty
-                if line.strip():
-                # if its the first line then go to the next one
-                    if line.strip().startswith("Name"):
-                        continue
-                    # if we find a line that starts with total then we are done, break out from the loop
-                    elif line.strip().startswith("Total"):
-                        break
-                    # it must be a line of interest, parse it
-                    else:
-                        # split line by space :
-                        #"vm-148-102.uc.futu LINUX      X86_64 Unclaimed Idle     0.150  2048  0+00:00:04"
-                        line_columns = line.split()
-                        try:
-                            tmp_fqdn = line_columns[0].strip()
-                            condor_list.append(tmp_fqdn)
-                        except Exception as expt:
-                            LOG.info("Error parsing condor status, line says : %s and the expt says : %s" % (line, str(expt)))
+        snapshot = None
+        if self.poller:
+            snapshot = self.poller.wait_for_newer(self.version, 2 * self.poller.interval)
+        # No new snapshot in time: query the master directly
+        if snapshot:
+            self.version = snapshot.version
+            condor_list = snapshot.worker_names()
+        else:
+            command = "condor_status"
+            rcmd = RemoteCommand(
+                config = self.config,
+                hostname = self.master.dns,
+                ssh_private_key = self.config.globals.priv_path,
+                user = self.config.workload.user,
+                command = command)
+            rcmd.execute()
+            condor_list = [worker.name for worker in parse_condor_status(rcmd.stdout)]
         LOG.info("Condor worker names: %s" % (str(condor_list)))
 
         # instances running in this cloud
@@ -9,11 +9,13 @@ LOG = logging.getLogger(__name__)
 
 class InitialMonitor(Thread):
 
-    def __init__(self, config, master, expected_worker_count, interval=120):
+    def __init__(self, config, master, expected_worker_count, interval=120, poller=None):
 
         Thread.__init__(self)
         self.config = config
         self.master = master
+        self.poller = poller
+        self.version = 0
         self.interval = interval
         self.expected_worker_count = expected_worker_count
         self.limit = int(self.config.globals.initial_monitor_time_limit)
@@ -76,6 +78,13 @@ class InitialMonitor(Thread):
 
     def idle_workers_count(self):
 
+        if self.poller:
+            # No new snapshot in time: query the master directly
+            snapshot = self.poller.wait_for_newer(self.version, 2 * self.poller.interval)
+            if snapshot:
+                self.version = snapshot.version
+                return snapshot.idle_workers_count()
+
         command = "condor_status | grep Idle"
         rcmd = RemoteCommand(
             config = self.config,
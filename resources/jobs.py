@@ -1,71 +1,200 @@
 import logging
+import time
+
+from array import array
 from lib.util import RemoteCommand
 
 LOG = logging.getLogger(__name__)
 
+# JobStatus codes used by Condor
+JOB_IDLE = 1
+JOB_RUNNING = 2
+JOB_REMOVED = 3
+JOB_COMPLETED = 4
+JOB_HELD = 5
+JOB_TRANSFERRING = 6
+JOB_SUSPENDED = 7
+
+# Attributes requested from condor_q, one line per job (in this order)
+JOB_ATTRIBUTES = ["ClusterId", "ProcId", "JobStatus", "RemoteHost", "RemoteWallClockTime", "ShadowBday", "ServerTime"]
+
+def job_query_command(user):
+    """ Returns the condor_q command that lists all jobs of the user in the machine-readable format """
+
+    return "condor_q %s -autoformat %s" % (user, " ".join(JOB_ATTRIBUTES))
+
 class Job(object):
 
-    def __init__(self, id, running, node):
+    __slots__ = ("id", "runtime", "node")
+
+    def __init__(self, id, runtime, node):
 
         self.id = id
-        self.running = running
+        # Accumulated runtime in seconds
+        self.runtime = runtime
         self.node = node
 
+class JobTable(object):
+    """ JobTable class holds all jobs in the queue in columns: id, status, execute node and accumulated runtime (sec)
+
+    It is built from one condor_q call and answers job counts (total, by state, by cloud) and running jobs
+    without further queries. A parsed table is not modified afterwards: running jobs and the node index
+    are built on first use and shared by everyone who holds the table
+
+    """
+    def __init__(self):
+        self.ids = []
+        self.statuses = array('b')
+        self.nodes = []
+        self.runtimes = array('l')
+        self.running = None
+        self.node_index = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, job_id, status, node, runtime):
+        self.ids.append(job_id)
+        self.statuses.append(status)
+        self.nodes.append(node)
+        self.runtimes.append(runtime)
+        self.running = None
+        self.node_index = None
+
+    @classmethod
+    def parse(cls, output):
+        """ Parses the output of the command returned by job_query_command """
+
+        table = cls()
+        if not output:
+            return table
+        now = int(time.time())
+        for line in output.split("\n"):
+            columns = line.split()
+            if len(columns) != len(JOB_ATTRIBUTES):
+                if columns:
+                    LOG.info("Skipping unexpected line in condor_q output: %s" % (line))
+                continue
+            cluster_id, proc_id, status, remote_host, wall_clock, shadow_bday, server_time = columns
+            try:
+                status = int(status)
+                runtime = int(float(wall_clock)) if wall_clock != "undefined" else 0
+                if status == JOB_RUNNING and shadow_bday != "undefined":
+                    # Time spent in the current run is not part of RemoteWallClockTime yet
+                    if server_time != "undefined":
+                        now = int(server_time)
+                    runtime += max(0, now - int(shadow_bday))
+            except ValueError:
+                LOG.info("Skipping unexpected line in condor_q output: %s" % (line))
+                continue
+            if remote_host == "undefined":
+                node = None
+            else:
+                # slot1@vm-148-102.uc.futuregrid.org -> vm-148-102.uc.futuregrid.org
+                node = remote_host.split("@")[-1]
+            table.append("%s.%s" % (cluster_id, proc_id), status, node, runtime)
+        return table
+
+    def count_by_state(self):
+        """ Returns a dictionary: JobStatus code -> number of jobs """
+
+        counts = {}
+        for status in self.statuses:
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def count_by_cloud(self, node_to_cloud):
+        """ Returns a dictionary: cloud name -> number of running jobs, given a mapping: node dns -> cloud name """
+
+        counts = {}
+        for index in xrange(len(self.ids)):
+            if self.statuses[index] == JOB_RUNNING:
+                cloud_name = node_to_cloud.get(self.nodes[index])
+                if cloud_name:
+                    counts[cloud_name] = counts.get(cloud_name, 0) + 1
+        return counts
+
+    def running_jobs(self):
+        """ Returns a tuple of jobs that are running (have an execute node) """
+
+        if self.running == None:
+            jobs_list = []
+            for index in xrange(len(self.ids)):
+                if self.statuses[index] == JOB_RUNNING and self.nodes[index]:
+                    jobs_list.append(Job(self.ids[index], self.runtimes[index], self.nodes[index]))
+            self.running = tuple(jobs_list)
+        return self.running
+
+    def get_node_index(self):
+        """ Returns a dictionary: execute node dns -> tuple of jobs running there (must not be modified) """
+
+        if self.node_index == None:
+            index = {}
+            for job in self.running_jobs():
+                index.setdefault(job.node, []).append(job)
+            for node in index:
+                index[node] = tuple(index[node])
+            self.node_index = index
+        return self.node_index
+
+    def get_node_jobs(self, node):
+        """ Returns a tuple of jobs running on the node (empty if the node is idle) """
+
+        return self.get_node_index().get(node, ())
+
 class Jobs(object):
 
-    def __init__(self, config, master_dns):
+    def __init__(self, config, master_dns, poller=None):
 
         self.config = config
         self.master_dns = master_dns
-        self.command_job_list =  "condor_q -run | grep %s" % (self.config.workload.user)
-        # No -run in the next command, all jobs (including the ones that aren't scheduled yet)
-        self.command_job_count = "condor_q | grep %s | wc -l" % (self.config.workload.user)
+        # CondorPoller (optional): if given, job information comes from its snapshots
+        self.poller = poller
+        self.version = 0
+        # All jobs of the user, including the ones that aren't scheduled yet
+        self.command_job_table = job_query_command(self.config.workload.user)
+        self.table = JobTable()
         self.list = []
 
-    def update_current_list(self):
+    def update_current_table(self):
+        """ Obtains the current job table (one query) and the list of running jobs """
 
-        rcmd = RemoteCommand(
-            config = self.config,
-            hostname = self.master_dns,
-            ssh_private_key = self.config.globals.priv_path,
-            user = self.config.workload.user,
-            command = self.command_job_list)
-        rcmd.execute()
-        queue_state = rcmd.stdout
+        snapshot = self.get_poller_snapshot()
+        if snapshot:
+            self.table = snapshot.job_table
+        else:
+            rcmd = RemoteCommand(
+                config = self.config,
+                hostname = self.master_dns,
+                ssh_private_key = self.config.globals.priv_path,
+                user = self.config.workload.user,
+                command = self.command_job_table)
+            if rcmd.execute() == None:
+                # An empty table would make all workers look idle; keep the last one
+                LOG.error("Could not query the job queue on the master. Using the previous job table")
+            else:
+                self.table = JobTable.parse(rcmd.stdout)
+        self.list = list(self.table.running_jobs())
+        return self.table
 
-        self.list = []
-        if queue_state != None:
-            items = queue_state.split()
-            if self.config.workload.user in items:
-                start = items.index(self.config.workload.user) - 1
-
-                uc = 0
-                sdcs = 0
-                total = 0
-                for i in range(start, len(items), 6):
-                    #print "Job %s running for %s on %s" % (items[i], items[i+4], items[i+5])
-                    self.list.append(Job(items[i], items[i+4], items[i+5]))
-                    node = items[i+5]
-                    if "uc" in node:
-                        uc += 1
-                    if "sdcs" in node:
-                        sdcs += 1
-                    total += 1
-                print "Jobs: total: %d, Hotel: %d, Sierra: %d" % (total, uc, sdcs)
+    def update_current_list(self):
 
+        self.update_current_table()
+        counts = self.table.count_by_state()
+        LOG.info("Jobs: total: %d, running: %d, idle: %d"
+                 % (len(self.table), counts.get(JOB_RUNNING, 0), counts.get(JOB_IDLE, 0)))
 
     def get_current_number(self):
 
-        rcmd = RemoteCommand(
-                config = self.config,
-                hostname = self.master_dns,
-                ssh_private_key = self.config.globals.priv_path,
-                user = self.config.workload.user,
-                command = self.command_job_count)
-        rcmd.execute()
+        return len(self.update_current_table())
 
-        if not rcmd.stdout:
-            return 0
-        else:
-            return int(rcmd.stdout)
+    def get_poller_snapshot(self):
+        """ Returns a snapshot published by the poller after the one used last time by this object;
+        None if there is no poller or it has not published anything in time (then the master is queried directly) """
 
+        if not self.poller:
+            return None
+        snapshot = self.poller.wait_for_newer(self.version, 2 * self.poller.interval)
+        if snapshot:
+            self.version = snapshot.version
+        return snapshot
@@ -0,0 +1,127 @@
+import base64
+import binascii
+import logging
+import os
+import threading
+import zlib
+
+from lib.util import Command, RemoteCommand
+
+LOG = logging.getLogger(__name__)
+
+class LogSync(object):
+    """ LogSync class keeps a local copy of a file on the master that only grows (e.g. the Condor user log)
+
+    It remembers how many bytes are synced and transfers only the byte range appended since then, gzip-compressed
+    and base64-encoded over the pooled ssh session. The range is written at the synced offset and flushed to disk
+    before the offset moves, and the local size is checked against the remote one. If the remote file got shorter
+    (was rewritten) or the written copy has the wrong size, the whole file is copied again with scp
+
+    """
+    def __init__(self, config, hostname, remote_file, local_file):
+        self.config = config
+        self.hostname = hostname
+        # Relative to the home directory of the workload user on the master
+        self.remote_file = remote_file
+        self.local_file = local_file
+        self.offset = 0
+        # Periodic syncs from the workload thread may overlap with the final one
+        self.lock = threading.Lock()
+
+    def remote_command(self, command, log_output=True):
+        return RemoteCommand(
+            config = self.config,
+            hostname = self.hostname,
+            ssh_private_key = self.config.globals.priv_path,
+            user = self.config.workload.user,
+            command = command,
+            log_output = log_output)
+
+    def get_remote_size(self):
+        """ Returns the size of the remote file in bytes, None if it can't be obtained """
+
+        rcmd = self.remote_command("stat -c %%s ~/%s" % (self.remote_file))
+        if rcmd.execute() != 0:
+            return None
+        try:
+            return int(rcmd.stdout)
+        except (TypeError, ValueError):
+            return None
+
+    def fetch_range(self, offset, length):
+        """ Returns length bytes of the remote file starting at offset, None if the transfer fails """
+
+        rcmd = self.remote_command("tail -c +%d ~/%s | head -c %d | gzip -c | base64"
+                                   % (offset + 1, self.remote_file, length), log_output=False)
+        if rcmd.execute() != 0:
+            return None
+        try:
+            data = zlib.decompress(base64.b64decode(rcmd.stdout), 16 + zlib.MAX_WBITS)
+        except (TypeError, binascii.Error, zlib.error) as ex:
+            LOG.error("Invalid data received for %s from the master: %s" % (self.remote_file, str(ex)))
+            return None
+        if len(data) != length:
+            LOG.error("Received %d bytes of %s instead of %d" % (len(data), self.remote_file, length))
+            return None
+        return data
+
+    def write_range(self, offset, data):
+        """ Writes data at the offset of the local file (dropping anything after it) and flushes it to disk """
+
+        mode = 'r+b' if os.path.isfile(self.local_file) else 'wb'
+        with open(self.local_file, mode) as file_obj:
+            file_obj.seek(offset)
+            file_obj.truncate()
+            file_obj.write(data)
+            file_obj.flush()
+            os.fsync(file_obj.fileno())
+
+    def sync(self):
+        """ Brings the local copy up to date; returns True on success
+
+        If the master can't be reached the offset and the local copy are kept as they are, so the next sync
+        continues from the same place
+        """
+
+        with self.lock:
+            size = self.get_remote_size()
+            if size == None:
+                LOG.error("Could not obtain the size of %s on the master" % (self.remote_file))
+                return False
+            if size < self.offset:
+                LOG.info("%s on the master is shorter than the synced part, copying it again" % (self.remote_file))
+                return self.full_sync()
+            if size == self.offset:
+                return True
+
+            data = self.fetch_range(self.offset, size - self.offset)
+            if data == None:
+                LOG.error("Could not obtain new bytes of %s from the master node" % (self.remote_file))
+                return False
+            self.write_range(self.offset, data)
+            if os.path.getsize(self.local_file) != size:
+                LOG.error("Local copy of %s does not match the size on the master" % (self.remote_file))
+                return self.full_sync()
+            LOG.info("Obtained %d new bytes of %s from the master node" % (size - self.offset, self.remote_file))
+            self.offset = size
+            return True
+
+    def full_sync(self):
+        """ Copies the whole file with scp; must be called with the lock held
+
+        The file is copied next to the local copy and replaces it only when the copy succeeds
+        """
+
+        tmp_file = self.local_file + ".tmp"
+        scp_string = "scp %s@%s:~/%s %s" % (self.config.workload.user, self.hostname, self.remote_file, tmp_file)
+        scp_cmd = Command(scp_string)
+        code = scp_cmd.execute()
+        if code == 0:
+            os.rename(tmp_file, self.local_file)
+            self.offset = os.path.getsize(self.local_file)
+            LOG.info("Successfully obtained the log from the master node")
+            return True
+        if os.path.isfile(tmp_file):
+            os.remove(tmp_file)
+        LOG.error("Error occurred during obtaining the log from the master node")
+        return False
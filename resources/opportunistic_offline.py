@@ -1,24 +1,28 @@
+import heapq
 import logging
-import copy
 import operator
 import time
 
 from threading import Thread
 from resources.jobs import Jobs
+from resources.snapshot import ClusterSnapshot
+from resources.rebalance import plan_rebalance
 from lib.logger import filelog
-from resources.workers import Worker
+from lib.util import format_runtime
+from resources.workerops import WorkerOperations, count_terminated
 
 LOG = logging.getLogger(__name__)
 
 class OpportunisticOfflineDownscaler(Thread):
 
-    def __init__(self, stop_event, config, master, phantom_client, interval=120, check_within_interval_limit=20):
+    def __init__(self, stop_event, config, master, phantom_client, interval=120, check_within_interval_limit=20, poller=None):
 
         Thread.__init__(self)
         self.stop_event = stop_event
         self.config = config
         self.master = master
         self.interval = interval
+        self.poller = poller
         self.phantom_client = phantom_client
         self.get_desired_dict()
 
@@ -29,7 +33,9 @@ class OpportunisticOfflineDownscaler(Thread):
     def run(self):
 
         LOG.info("Activating OO. Sleep period: %d sec" % (self.interval))
-        jobs = Jobs(self.config, self.master.dns)
+        jobs = Jobs(self.config, self.master.dns, self.poller)
+        worker_ops = WorkerOperations(self.config, self.master.dns, self.phantom_client,
+                                      self.config.policy.worker_parallelism)
 
         while(not self.stop_event.is_set()):
 
@@ -39,7 +45,7 @@ class OpportunisticOfflineDownscaler(Thread):
             # - either when the counter equals the limit -- then try marking nodes offline
             # - any other iteration -- then only terminate idle instances if any in the marked_offline_list
             self.check_within_interval_counter += 1
-            if self.check_within_interval_counter == self.self.check_within_interval_limit:
+            if self.check_within_interval_counter == self.check_within_interval_limit:
                 allow_marking_offline = True
                 # Rest and go back to the beginning of the cycle
                 self.check_within_interval_counter = 0
@@ -48,8 +54,9 @@ class OpportunisticOfflineDownscaler(Thread):
                 allow_marking_offline = False
                 LOG.info("OI's iteration with termination of previously marked instances")
 
-            curr_dict = self.get_current_dict()
-            jobs.update_current_list()
+            # All remote reads of this iteration happen here
+            snapshot = ClusterSnapshot.take(self.config, self.phantom_client, jobs)
+            curr_dict = self.get_current_dict(snapshot)
 
             pool_dict_str = "%s," % (time.time())
             for cloud_name, instance_count in curr_dict.iteritems():
@@ -64,6 +71,8 @@ class OpportunisticOfflineDownscaler(Thread):
                 diff_dict[cloud_name] = up_diff
 
 
+            victims = []
+            offline_victims = []
             for cloud_name in curr_dict:
                 if curr_dict[cloud_name] > self.desired_dict[cloud_name]:
                     LOG.info("Downscaling in %s" % (cloud_name))
@@ -73,18 +82,18 @@ class OpportunisticOfflineDownscaler(Thread):
                         # give me all idle_instances that are in self.marked_offline_list
                         # only these instances are allowed to be terminated
                         if self.marked_offline_list:
-                            candidates = self.get_candidates(cloud_name, jobs, down_diff, return_only_all_idle=True)
+                            candidates = self.get_candidates(cloud_name, snapshot, down_diff, return_only_all_idle=True)
                             idle_candidates = []
                             for cand in candidates:
                                 ins_id = cand[0]
-                                if tuple_id in self.marked_offline_list:
-                                    idle_candidates.append(ins_id)
+                                if ins_id in self.marked_offline_list:
+                                    idle_candidates.append(cand)
                                     LOG.info("Selecting idle offline instance for termination: %s" % (ins_id))
                                     self.marked_offline_list.remove(ins_id)
                         else:
                             idle_candidates = []
                     else:
-                        idle_candidates, nonidle_candidates = self.get_candidates(cloud_name, jobs, down_diff, return_only_all_idle=False)
+                        idle_candidates, nonidle_candidates = self.get_candidates(cloud_name, snapshot, down_diff, return_only_all_idle=False)
 
                     for instance_tuple in idle_candidates:
                         instance_id = instance_tuple[0]
@@ -94,52 +103,7 @@ class OpportunisticOfflineDownscaler(Thread):
                         filelog(self.config.discarded_work_log, "DISCARDED,%s,%s,%d" % (cloud_name, dns, 0))
                         filelog(self.config.node_log, "TERMINATED WORKER cloud: %s, instance: %s, dns: %s"
                                                       % (cloud_name, instance_id, dns))
-
-                        LOG.info("Desired capacity (before termination) is %d" % (self.phantom_client.asg.desired_capacity))
-                        Worker(self.config, instance_id, instance_info).terminate_condor(self.master.dns)
-                        self.phantom_client.terminate_instance(instance_id)
-                        LOG.info("Desired capacity (after termination) is %d" % (self.phantom_client.asg.desired_capacity))
-
-                        # upscale
-                        sorted_diff_dict = sorted(diff_dict.iteritems(), key=operator.itemgetter(1), reverse=True)
-                        if sorted_diff_dict[0][1] > 0:
-                            cloud_to_upscale = sorted_diff_dict[0][0]
-
-
-                            if cloud_to_upscale != cloud_name:
-                                # create new tag :
-                                current_cloud_tag = self.phantom_client.cloud_list.split(",")
-                                new_cloud_tag = ""
-                                new_cloud_count = 0
-                                LOG.info("Current cloud tag is %s" % (self.phantom_client.cloud_list))
-                                LOG.info("Current dict is %s" % (str(curr_dict)))
-                                LOG.info("Diff dict is %s" % (str(diff_dict)))
-                                for each_cloud in current_cloud_tag:
-                                    tmp_cloud_name = each_cloud.split(":")[0]
-                                    tmp_cloud_count = int(each_cloud.split(":")[1])
-                                    if tmp_cloud_name == cloud_to_upscale:
-                                        new_cloud_tag += "%s:%d," % (tmp_cloud_name, tmp_cloud_count +1)
-                                        curr_dict[tmp_cloud_name] += 1
-                                        diff_dict[tmp_cloud_name] -= 1
-                                    elif tmp_cloud_name == cloud_name:
-                                        new_cloud_tag += "%s:%d," % (tmp_cloud_name, tmp_cloud_count - 1)
-                                        curr_dict[tmp_cloud_name] -= 1
-                                        diff_dict[tmp_cloud_name] += 1
-                                    else:
-                                        new_cloud_tag += "%s:%d," % (tmp_cloud_name, tmp_cloud_count)
-                                    new_cloud_count += curr_dict[tmp_cloud_name]
-
-                                new_cloud_tag_no_comma = new_cloud_tag[:-1]
-                                LOG.info("New cloud tag is %s" % (new_cloud_tag_no_comma))
-                                LOG.info("New Current dict is %s" % (str(curr_dict)))
-                                LOG.info("New Diff dict is %s" % (str(diff_dict)))
-                                LOG.info("New Desired capacity (after recounting) is %d" % (new_cloud_count))
-
-                                self.phantom_client.update_tags(new_cloud_tag_no_comma, new_cloud_count)
-                                self.phantom_client.cloud_list = new_cloud_tag_no_comma
-                                self.phantom_client.asg.set_capacity(new_cloud_count)
-                            else:
-                                LOG.info("Trying to upscale and downscale in the same cloud .. STOPPED")
+                        victims.append((cloud_name, instance_id, instance_info))
 
                     if allow_marking_offline:
                         for instance_tuple in nonidle_candidates:
@@ -150,10 +114,22 @@ class OpportunisticOfflineDownscaler(Thread):
                             filelog(self.config.node_log, "OFFLINED WORKER cloud: %s, instance: %s, dns: %s"
                                                           % (cloud_name, instance_id, dns))
                             filelog(self.config.discarded_work_log, "OFFLINE,%s,%s,%d" % (cloud_name, dns, 0))
+                            offline_victims.append((cloud_name, instance_id, instance_info))
+
+            # Victims of all clouds are handled concurrently
+            LOG.info("Desired capacity (before termination) is %d" % (self.phantom_client.asg.desired_capacity))
+            terminated_dict = count_terminated(worker_ops.terminate(victims))
+            LOG.info("Desired capacity (after termination) is %d" % (self.phantom_client.asg.desired_capacity))
+
+            # Offline workers later become idle and get terminated
+            for result in worker_ops.offline(offline_victims):
+                if result.success:
+                    self.marked_offline_list.append(result.instance_id)
 
-                            worker = Worker(self.config, instance_id, instance_info)
-                            worker.offline(self.master.dns) # marks node offline (it later becomes idle and get terminated)
-                            self.marked_offline_list.append(instance_id)
+            # Replace terminated instances in the clouds that lack instances: one Phantom update per iteration
+            plan = plan_rebalance(self.phantom_client.cloud_list, curr_dict, self.desired_dict, terminated_dict)
+            if plan:
+                self.phantom_client.apply_rebalance(plan)
 
 
     def get_desired_dict(self):
@@ -165,26 +141,15 @@ class OpportunisticOfflineDownscaler(Thread):
         LOG.info("OO determined desired dictionary: %s" % (str(self.desired_dict)))
         return
 
-    def get_current_dict(self):
-
-
-        pool_dict = {}
-        asg_info = self.phantom_client.get_autoscale_groups_info(self.phantom_client.asg.name)
-        all_instances_info = asg_info[self.phantom_client.asg.name]['instances']
-        instances_info = self.phantom_client.get_alive_instnaces(all_instances_info)
+    def get_current_dict(self, snapshot):
 
-        for acloud in self.config.clouds.list:
-            pool_dict[acloud] = 0
-            for instance_id in instances_info:
-                if instances_info[instance_id]['cloud_name'] == acloud:
-                    pool_dict[acloud] += 1
+        pool_dict = snapshot.get_current_dict()
         LOG.info("OO found current instance dictionary: %s" % (str(pool_dict)))
 
-
         return pool_dict
 
 
-    def get_candidates(self, cloud_name, jobs, count, return_only_all_idle=False):
+    def get_candidates(self, cloud_name, snapshot, count, return_only_all_idle=False):
         """ Returns two lists of instances that should be terminated.
             idle_list: if there are any idle instances they will be returned in this list (and can be hard terminated).
             nonidle_list: if count > number of idle instances, then this list will include non-idle instances
@@ -194,26 +159,14 @@ class OpportunisticOfflineDownscaler(Thread):
             At the same time, either list can be empty
         """
 
-        asg_info = self.phantom_client.get_autoscale_groups_info(self.phantom_client.asg.name)
-        all_instances_info = asg_info[self.phantom_client.asg.name]['instances']
-        instances = self.phantom_client.get_alive_instnaces(all_instances_info)
-
-        localjobs = copy.copy(jobs)
-
         idle_list = []
         nonidle_list = []
-        for instance in instances:
-            if instances[instance]['cloud_name'] != cloud_name:
-                continue
-            job_matching_found = False
-            for job in localjobs.list:
-                if instances[instance]['public_dns'] == job.node:
-                    nonidle_list.append( (instance, job.running, instances[instance]) )
-                    localjobs.list.remove(job)
-                    job_matching_found = True
-                    break
-            if not job_matching_found:
-                idle_list.append( (instance, instances[instance]) )
+        for instance, instance_info in snapshot.get_cloud_instances(cloud_name):
+            node_jobs = snapshot.get_node_jobs(instance_info['public_dns'])
+            if node_jobs:
+                nonidle_list.append( (instance, node_jobs[0].runtime, instance_info) )
+            else:
+                idle_list.append( (instance, instance_info) )
 
         # Truncate idle list if needed (in case there are more idle instances than count)
         # Does not do anything if count >= len(idle_list)
@@ -230,18 +183,15 @@ class OpportunisticOfflineDownscaler(Thread):
                 idle_list_str += "%s:%s," % (instance[0], instance[1]['public_dns'])
             LOG.info("OO found idle candidates for termination in %s: %s" % (cloud_name, idle_list_str))
 
-        # Sort by the run time in the decreasing order
-        sorted_nonidle_list = sorted(nonidle_list, key=operator.itemgetter(1), reverse=True)
-
         remaining_count = count - len(idle_list)
-        # Truncate sorted non-idle list if needed (in case remaining_count < len(sorted_nonidle_list))
-        sorted_nonidle_list = sorted_nonidle_list[:remaining_count]
+        # Longest-running first; only remaining_count of them are needed: O(n log k) instead of a full sort
+        sorted_nonidle_list = heapq.nlargest(max(remaining_count, 0), nonidle_list, key=operator.itemgetter(1))
 
         sorted_nonidle_list_instances_only = []
         if sorted_nonidle_list:
             nonidle_list_str = ""
             for atuple in sorted_nonidle_list:
-                nonidle_list_str += "%s:%s:%s," % (atuple[0], atuple[2]['public_dns'], atuple[1])
+                nonidle_list_str += "%s:%s:%s," % (atuple[0], atuple[2]['public_dns'], format_runtime(atuple[1]))
                 sorted_nonidle_list_instances_only.append((atuple[0], atuple[2] ))
             LOG.info("OO found non-idle candidates for termination in %s: %s" % (cloud_name, nonidle_list_str))
 
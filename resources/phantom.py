@@ -172,26 +172,38 @@ class PhantomClient(object):
         else:
             LOG.error("No connection to Phantom")
 
+    def apply_rebalance(self, plan):
+        """ Applies a RebalancePlan with one tags update and one capacity update """
+
+        LOG.info("Current cloud tag is %s" % (self.cloud_list))
+        LOG.info("Moving instances (from, to): %s" % (str(plan.moves)))
+        LOG.info("New cloud tag is %s, new desired capacity is %d" % (plan.cloud_list, plan.capacity))
+        self.update_tags(plan.cloud_list, plan.capacity)
+        self.cloud_list = plan.cloud_list
+        self.asg.set_capacity(plan.capacity)
+
     def terminate_instance(self, instance_id):
         self.conn.terminate_instance(instance_id, decrement_capacity=True)
 
-    def build_instances_info(self,all_instances):
+    def build_instances_info(self, all_instances, instances_index=None):
         if not self.conn:
             self.connect()
 
+        # Join with the inventories of all clouds: one listing per cloud rather than per instance
+        if instances_index == None:
+            instances_index = self.clouds.index_instances(refresh=True)
+
         instance_dict = {}
 
         for instance in all_instances:
             instance_dict[instance.instance_id] = {"health_status": instance.health_status,
                                                        "lifecycle_state": instance.lifecycle_state}
-            cloud_obj = self.clouds.get_instance_cloud(instance.instance_id)
+            located = instances_index.get(instance.instance_id)
 
-            if cloud_obj:
+            if located:
+                cloud_obj, instance_obj = located
                 instance_dict[instance.instance_id]['cloud_name'] = cloud_obj.name
-                instance_obj = cloud_obj.get_instance_by_id(instance.instance_id)
-
-                if instance_obj:
-                    instance_dict[instance.instance_id]["public_dns"] = instance_obj.public_dns_name
+                instance_dict[instance.instance_id]["public_dns"] = instance_obj.public_dns_name
         return instance_dict
 
     def get_alive_instnaces(self, all_instances):
@@ -206,11 +218,12 @@ class PhantomClient(object):
 
     def get_autoscale_groups_info(self, asg_name):
         asg_list = self.conn.get_all_groups()
+        instances_index = self.clouds.index_instances(refresh=True)
         asg_dict = {}
         for asg in asg_list:
             asg_dict[asg.name] = {}
             asg_dict[asg.name]['launch_config_name'] = asg.launch_config_name
-            asg_dict[asg.name]['instances'] = self.build_instances_info(asg.instances)
+            asg_dict[asg.name]['instances'] = self.build_instances_info(asg.instances, instances_index)
         return asg_dict
 
 
@@ -10,10 +10,11 @@ LOG = logging.getLogger(__name__)
 
 class Policy(object):
 
-    def __init__(self, config, master, phantom_client):
+    def __init__(self, config, master, phantom_client, poller=None):
 
         self.config = config
         self.master = master
+        self.poller = poller
         self.running = False
         self.phantom_client = phantom_client
         self.name = self.config.policy.policy_in_place
@@ -25,24 +26,27 @@ class Policy(object):
             self.simulators_stops = []
             for group in self.config.workers.worker_groups:
                 fs_stop = Event()
-                fs = FailureSimulator(fs_stop, self.config, self.master, group)
+                fs = FailureSimulator(fs_stop, self.config, self.master, group, self.poller)
                 fs.start()
                 self.simulators.append(fs)
                 self.simulators_stops.append(fs_stop)
 
         elif self.name == "OPPORTUNISTIC_IDLE":
             self.downscaler_stop = Event()
-            self.downscaler = OpportunisticIdleDownscaler(self.downscaler_stop, self.config, self.master, self.phantom_client, self.config.downscaler_interval)
+            self.downscaler = OpportunisticIdleDownscaler(self.downscaler_stop, self.config, self.master, self.phantom_client,
+                                                    self.config.downscaler_interval, poller=self.poller)
             self.downscaler.start()
 
         elif self.name == "OPPORTUNISTIC_OFFLINE":
             self.downscaler_stop = Event()
-            self.downscaler = OpportunisticOfflineDownscaler(self.downscaler_stop, self.config, self.master, self.phantom_client, self.config.downscaler_interval)
+            self.downscaler = OpportunisticOfflineDownscaler(self.downscaler_stop, self.config, self.master, self.phantom_client,
+                                                    self.config.downscaler_interval, poller=self.poller)
             self.downscaler.start()
 
         elif self.name == "AGGRESSIVE":
             self.downscaler_stop = Event()
-            self.downscaler = AggressiveDownscaler(self.downscaler_stop, self.config, self.master, self.phantom_client, self.config.downscaler_interval)
+            self.downscaler = AggressiveDownscaler(self.downscaler_stop, self.config, self.master, self.phantom_client,
+                                                    self.config.downscaler_interval, poller=self.poller)
             self.downscaler.start()
 
         self.running = True
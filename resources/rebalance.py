@@ -0,0 +1,69 @@
+import heapq
+import logging
+
+LOG = logging.getLogger(__name__)
+
+def parse_cloud_list(cloud_list):
+    """ Parses Phantom's clouds tag, e.g. "hotel:2,sierra:1", into a list of (cloud name, count) pairs """
+
+    allocation = []
+    for each_cloud in cloud_list.split(","):
+        allocation.append((each_cloud.split(":")[0], int(each_cloud.split(":")[1])))
+    return allocation
+
+def format_cloud_list(allocation):
+    """ Forms Phantom's clouds tag out of a list of (cloud name, count) pairs """
+
+    return ",".join(["%s:%d" % (cloud_name, count) for cloud_name, count in allocation])
+
+class RebalancePlan(object):
+    """ RebalancePlan class describes the Phantom update for one downscaler iteration:
+    the new clouds tag, the new capacity of the domain and the moves (from cloud, to cloud) it consists of """
+
+    def __init__(self, cloud_list, capacity, moves):
+        self.cloud_list = cloud_list
+        self.capacity = capacity
+        self.moves = moves
+
+def plan_rebalance(cloud_list, curr_dict, desired_dict, terminated_dict):
+    """ Computes the allocation after the terminations of one iteration in one pass
+
+    Every terminated instance is replaced in the cloud that lacks the most instances (desired - current),
+    unless that is the cloud it was terminated in or no cloud lacks instances; in the latter cases the
+    replacement is not requested and the capacity shrinks by one.
+
+    cloud_list: current clouds tag; curr_dict, desired_dict: cloud name -> instance count before terminations;
+    terminated_dict: cloud name -> number of instances terminated in this iteration
+
+    Returns a RebalancePlan, or None if no instance is moved (then Phantom does not need an update)
+    """
+
+    # Max-heap of clouds by the number of lacking instances; ties are broken by cloud name
+    heap = []
+    for cloud_name in curr_dict:
+        heapq.heappush(heap, (curr_dict[cloud_name] - desired_dict[cloud_name], cloud_name))
+
+    allocation = parse_cloud_list(cloud_list)
+    counts = dict(allocation)
+    moves = []
+    unplaced = 0
+    for cloud_name in sorted(terminated_dict):
+        for i in range(terminated_dict[cloud_name]):
+            surplus, cloud_to_upscale = heap[0]
+            # The tag can lag behind the actual pool; never request a negative count
+            if surplus < 0 and cloud_to_upscale != cloud_name and counts.get(cloud_name, 0) > 0:
+                heapq.heapreplace(heap, (surplus + 1, cloud_to_upscale))
+                counts[cloud_to_upscale] = counts.get(cloud_to_upscale, 0) + 1
+                counts[cloud_name] = counts.get(cloud_name, 0) - 1
+                moves.append((cloud_name, cloud_to_upscale))
+            else:
+                unplaced += 1
+                if surplus < 0 and cloud_to_upscale == cloud_name:
+                    LOG.info("Trying to upscale and downscale in the same cloud .. STOPPED")
+
+    if not moves:
+        return None
+
+    new_allocation = [(cloud_name, counts[cloud_name]) for cloud_name, count in allocation]
+    capacity = sum(curr_dict.values()) - unplaced
+    return RebalancePlan(format_cloud_list(new_allocation), capacity, moves)
@@ -0,0 +1,75 @@
+import logging
+import time
+
+LOG = logging.getLogger(__name__)
+
+class ClusterSnapshot(object):
+    """ ClusterSnapshot class is a read-only view of the cluster taken once per downscaler iteration
+
+    It combines autoscaling group membership, information about alive instances (cloud name, public dns)
+    and the table of jobs in the queue, so that all decision steps of an iteration look at the same state
+    and no step has to query Phantom, the clouds or the master again
+
+    """
+    def __init__(self, cloud_names, instances, job_table):
+        object.__setattr__(self, "timestamp", time.time())
+        object.__setattr__(self, "cloud_names", tuple(cloud_names))
+        object.__setattr__(self, "instances", dict(instances))
+        object.__setattr__(self, "job_table", job_table)
+
+        by_cloud = {}
+        for cloud_name in self.cloud_names:
+            by_cloud[cloud_name] = []
+        for instance_id, instance_info in self.instances.iteritems():
+            by_cloud.setdefault(instance_info['cloud_name'], []).append((instance_id, instance_info))
+        for cloud_name in by_cloud:
+            by_cloud[cloud_name] = tuple(by_cloud[cloud_name])
+        object.__setattr__(self, "by_cloud", by_cloud)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ClusterSnapshot is read-only")
+
+    @classmethod
+    def take(cls, config, phantom_client, jobs):
+        """ Performs the remote reads of one iteration: Phantom (with cloud inventories) and the job queue """
+
+        asg_name = phantom_client.asg.name
+        asg_info = phantom_client.get_autoscale_groups_info(asg_name)
+        all_instances_info = asg_info[asg_name]['instances']
+        instances_info = phantom_client.get_alive_instnaces(all_instances_info)
+        jobs.update_current_list()
+        snapshot = cls(config.clouds.list, instances_info, jobs.table)
+        running_dict = snapshot.get_running_jobs_dict()
+        LOG.info("Running jobs by cloud: %s"
+                 % (", ".join(["%s: %d" % (cloud_name, running_dict[cloud_name]) for cloud_name in snapshot.cloud_names])))
+        return snapshot
+
+    def get_cloud_instances(self, cloud_name):
+        """ Returns a tuple of (instance id, instance info) pairs for alive instances in the cloud """
+
+        return self.by_cloud.get(cloud_name, ())
+
+    def get_node_jobs(self, node):
+        """ Returns a tuple of jobs running on the node with the given public dns (empty if it is idle) """
+
+        return self.job_table.get_node_jobs(node)
+
+    def get_current_dict(self):
+        """ Returns a new dictionary: cloud name -> number of alive instances """
+
+        pool_dict = {}
+        for cloud_name in self.cloud_names:
+            pool_dict[cloud_name] = len(self.get_cloud_instances(cloud_name))
+        return pool_dict
+
+    def get_running_jobs_dict(self):
+        """ Returns a new dictionary: cloud name -> number of jobs running on its alive instances """
+
+        node_to_cloud = {}
+        for instance_id, instance_info in self.instances.iteritems():
+            node_to_cloud[instance_info['public_dns']] = instance_info['cloud_name']
+        running_dict = {}
+        for cloud_name in self.cloud_names:
+            running_dict[cloud_name] = 0
+        running_dict.update(self.job_table.count_by_cloud(node_to_cloud))
+        return running_dict
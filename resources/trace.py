@@ -0,0 +1,63 @@
+import logging
+
+from parsing.submit import DEFAULT_LOG, submit_header
+
+LOG = logging.getLogger(__name__)
+
+class TraceJob(object):
+
+    __slots__ = ("offset", "runtime", "attributes")
+
+    def __init__(self, offset, runtime, attributes=None):
+
+        # Seconds from the beginning of the replay to the submission of the job
+        self.offset = offset
+        # Seconds the job runs (argument of sleep)
+        self.runtime = runtime
+        # Additional submit commands for the job: list of (name, value) pairs
+        self.attributes = attributes or []
+
+def parse_trace_line(line):
+    """ Parses one line of a trace file: "<arrival offset> <runtime> [name=value ...]"; returns a TraceJob,
+    None for blank lines and comments (#) """
+
+    columns = line.split()
+    if not columns or columns[0].startswith("#"):
+        return None
+    attributes = []
+    for column in columns[2:]:
+        name, value = column.split("=", 1)
+        attributes.append((name, value))
+    return TraceJob(float(columns[0]), int(columns[1]), attributes)
+
+def iter_trace(trace_file):
+    """ Yields jobs of the trace file one by one, the file is read as a stream """
+
+    with open(trace_file) as file_obj:
+        for line_number, line in enumerate(file_obj):
+            try:
+                job = parse_trace_line(line)
+            except ValueError:
+                LOG.error("Skipping invalid line %d in trace %s: %s" % (line_number + 1, trace_file, line.strip()))
+                continue
+            if job:
+                yield job
+
+def attribute_names(job):
+    return [name for name, value in job.attributes]
+
+def can_batch(job, first_job):
+    """ Submit commands stay in effect for the following Queue statements of a description, so only jobs
+    that set the same commands (and override each other's values) can share one """
+
+    return attribute_names(job) == attribute_names(first_job)
+
+def render_batch(jobs, log_file=DEFAULT_LOG):
+    """ Returns one submit description with a Queue statement per job (see can_batch), logging to log_file """
+
+    lines = [submit_header(log_file)]
+    for job in jobs:
+        for name, value in job.attributes:
+            lines.append("%s = %s\n" % (name, value))
+        lines.append("Arguments = %d\nQueue\n" % (job.runtime))
+    return "".join(lines)
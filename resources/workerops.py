@@ -0,0 +1,134 @@
+import logging
+import time
+
+from Queue import Queue, Empty
+from threading import Thread
+from resources.condor import CondorAdmin
+
+LOG = logging.getLogger(__name__)
+
+# Number of workers handled at the same time (default)
+DEFAULT_PARALLELISM = 8
+
+class WorkerResult(object):
+
+    def __init__(self, action, cloud_name, instance_id, dns):
+
+        self.action = action
+        self.cloud_name = cloud_name
+        self.instance_id = instance_id
+        self.dns = dns
+        self.success = False
+        # Seconds the action took
+        self.elapsed = 0.0
+        self.error = None
+        # For terminations: whether condor_off -fast was sent to the worker (None if not attempted)
+        self.condor_stopped = None
+
+def count_terminated(results):
+    """ Returns a dictionary: cloud name -> number of instances terminated successfully """
+
+    terminated_dict = {}
+    for result in results:
+        if result.success:
+            terminated_dict[result.cloud_name] = terminated_dict.get(result.cloud_name, 0) + 1
+    return terminated_dict
+
+class WorkerOperations(object):
+    """ WorkerOperations class runs actions on a group of workers (stopping Condor and terminating instances,
+    marking workers offline) concurrently, at most parallelism at a time
+
+    Every action involves a round trip to the master or to Phantom; running them one by one made draining
+    a group of workers take minutes. Condor is handled by one condor_off command for the whole group (see
+    CondorAdmin), Phantom terminations run in threads. Victims are (cloud name, instance id, instance info)
+    tuples; a WorkerResult is returned for each of them, in the same order
+
+    """
+    def __init__(self, config, master_dns, phantom_client, parallelism=DEFAULT_PARALLELISM):
+        self.config = config
+        self.master_dns = master_dns
+        self.phantom_client = phantom_client
+        self.parallelism = max(1, parallelism)
+        self.condor_admin = CondorAdmin(config, master_dns)
+
+    def terminate(self, victims):
+        """ Stops Condor on the workers and terminates their instances (decrementing the capacity) """
+
+        if not victims:
+            return []
+        # The instances go away even if Condor could not be stopped on some of them (as before)
+        stopped = self.condor_admin.off_fast([instance_info['public_dns'] for cloud_name, instance_id, instance_info in victims])
+        results = self.run("terminate", self.terminate_one, victims)
+        for result in results:
+            result.condor_stopped = stopped.get(result.dns, False)
+            if not result.condor_stopped and result.error == None:
+                result.error = "condor_off -fast failed"
+        return results
+
+    def offline(self, victims):
+        """ Marks the workers offline: they finish their current jobs and don't accept new ones """
+
+        results = [WorkerResult("offline", cloud_name, instance_id, instance_info['public_dns'])
+                   for cloud_name, instance_id, instance_info in victims]
+        if not victims:
+            return results
+
+        start_time = time.time()
+        sent = self.condor_admin.off_peaceful([result.dns for result in results])
+        elapsed = time.time() - start_time
+        for result in results:
+            result.success = sent[result.dns]
+            result.elapsed = elapsed
+        LOG.info("Worker operations: offline succeeded for %d of %d workers in %.1f sec"
+                 % (len([result for result in results if result.success]), len(results), elapsed))
+        return results
+
+    def terminate_one(self, victim):
+        cloud_name, instance_id, instance_info = victim
+        self.phantom_client.terminate_instance(instance_id)
+        return True
+
+    def run(self, action, function, victims):
+
+        results = [WorkerResult(action, cloud_name, instance_id, instance_info['public_dns'])
+                   for cloud_name, instance_id, instance_info in victims]
+        if not victims:
+            return results
+
+        start_time = time.time()
+        tasks = Queue()
+        for index, victim in enumerate(victims):
+            tasks.put((index, victim))
+        threads = []
+        for i in range(min(self.parallelism, len(victims))):
+            thread = Thread(target=self.work, args=(function, tasks, results))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+        succeeded = len([result for result in results if result.success])
+        LOG.info("Worker operations: %s succeeded for %d of %d workers in %.1f sec (parallelism: %d)"
+                 % (action, succeeded, len(results), time.time() - start_time, self.parallelism))
+        return results
+
+    def work(self, function, tasks, results):
+        """ Body of an executor thread: takes victims from the queue until it is empty """
+
+        while True:
+            try:
+                index, victim = tasks.get_nowait()
+            except Empty:
+                return
+            result = results[index]
+            start_time = time.time()
+            try:
+                result.success = bool(function(victim))
+            except Exception as ex:
+                result.error = str(ex)
+                LOG.error("Worker operations: %s failed for instance %s: %s" % (result.action, result.instance_id, result.error))
+            result.elapsed = time.time() - start_time
+            LOG.info("Worker operations: %s %s for instance %s (%s) in %.1f sec"
+                     % (result.action, "succeeded" if result.success else "failed", result.instance_id,
+                        result.dns, result.elapsed))
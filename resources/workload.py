@@ -3,21 +3,36 @@ import time
 import os
 from threading import Thread
 
+from lib.logger import filelog
 from lib.util import Command, RemoteCommand
+from resources.arrivals import ArrivalScheduler, format_lag_summary
 from resources.jobs import Jobs
+from resources.logsync import LogSync
+from resources.trace import iter_trace, render_batch, can_batch
 
 LOG = logging.getLogger(__name__)
 
 class Workload(Thread):
 
-    def __init__(self, config, master, interval=30):
+    def __init__(self, config, master, interval=30, poller=None):
 
         Thread.__init__(self)
         self.config = config
         self.master = master
-        self.batch_files = os.listdir(self.config.workload.directory)
+        self.poller = poller
         self.interval = interval
+        self.trace = self.config.workload.trace
+        self.submit_window = self.config.workload.submit_window
+        self.scheduler = None
+        self.log_sync = LogSync(self.config, self.master.dns, self.config.workload.log_remote,
+                                "%s/sleep.log" % (self.config.log_dir))
+
+        if self.trace:
+            LOG.info("Workload trace: %s" % (self.trace))
+            self.batch_files = []
+            return
 
+        self.batch_files = os.listdir(self.config.workload.directory)
         if not self.batch_files:
             # Use default workload batch file (def: parsing/condor.submit)
             self.batch_files = [config.workload.submit_local]
@@ -34,8 +49,97 @@ class Workload(Thread):
 
     def run(self):
 
+        if self.trace:
+            sleep_time = self.submit_trace()
+        else:
+            sleep_time = self.submit_batch_files()
+
+        lag_summary = format_lag_summary(self.scheduler.lag_summary())
+        LOG.info("Arrival lag (sec): %s" % (lag_summary))
+        filelog(self.config.arrival_log, "LAG,%s" % (lag_summary))
+
+        # To give it enough time so the jobs are scheduled; unless specified otherwise
+        if sleep_time == 0:
+            time.sleep(60)
+
+        self.monitor()
+
+    def submit_trace(self):
+        """ Submits the jobs of the trace at their arrival offsets. Jobs arriving within submit_window seconds
+        from the first job of a batch are submitted with it in one description, piped to condor_submit on the
+        master (no files are created). Returns 0 (there is no sleep time after the last job) """
+
+        # Keep the trace with the other experiment files
+        copy_cmd = Command("cp %s %s/" % (self.trace, self.config.log_dir))
+        if copy_cmd.execute() != 0:
+            LOG.error("Error occurred during copying trace %s to the log directory" % (self.trace))
+
+        trace_jobs = iter_trace(self.trace)
+        self.scheduler = ArrivalScheduler()
+        job_index = 0
+        job = next(trace_jobs, None)
+        while job:
+            # Sleep until the deadline of the first job of the batch
+            self.scheduler.wait(job.offset)
+
+            # Jobs within the window and all overdue ones (when the replay is behind) go into the batch
+            batch = [job]
+            job = next(trace_jobs, None)
+            now = time.time()
+            while job and can_batch(job, batch[0]) and (job.offset < batch[0].offset + self.submit_window
+                                                        or self.scheduler.is_overdue(job.offset, now)):
+                batch.append(job)
+                job = next(trace_jobs, None)
+
+            exec_cmd = RemoteCommand(
+                config = self.config,
+                hostname = self.master.dns,
+                ssh_private_key = self.config.globals.priv_path,
+                user = self.config.workload.user,
+                command = 'condor_submit',
+                stdin = render_batch(batch, self.config.workload.log_remote))
+            code = exec_cmd.execute()
+            if code == 0:
+                self.record_arrivals(job_index, [batch_job.offset for batch_job in batch])
+            else:
+                LOG.error("Error occurred during submission of jobs %d-%d from trace %s"
+                          % (job_index, job_index + len(batch) - 1, self.trace))
+                self.record_failures(job_index, [batch_job.offset for batch_job in batch])
+
+            # Periodic log saving, every 100 jobs
+            if (job_index + len(batch)) // 100 > job_index // 100:
+                self.scp_log_back()
+            job_index += len(batch)
+        return 0
+
+    def record_arrivals(self, first_index, offsets):
+        """ Records the intended and achieved (now) arrival time of the jobs just submitted, numbered from
+        first_index, in the arrival log """
+
+        achieved = time.time()
+        for index, offset in enumerate(offsets):
+            lag = self.scheduler.record(offset, achieved)
+            filelog(self.config.arrival_log, "ARRIVAL,%d,%.3f,%.3f,%.3f"
+                                             % (first_index + index, self.scheduler.deadline(offset), achieved, lag))
+        LOG.info("Jobs %d-%d submitted, lag: %.3f sec"
+                 % (first_index, first_index + len(offsets) - 1, achieved - self.scheduler.deadline(offsets[0])))
+
+    def record_failures(self, first_index, offsets):
+        """ Records the intended arrival time of the jobs whose submission failed in the arrival log """
+
+        for index, offset in enumerate(offsets):
+            self.scheduler.record_failure(offset)
+            filelog(self.config.arrival_log, "FAILED,%d,%.3f" % (first_index + index, self.scheduler.deadline(offset)))
+
+    def submit_batch_files(self):
+        """ Copies the submit files to the master and submits them one by one; returns the sleep time of the last one """
+
+        sleep_time = 0
         batch_index = 0
-        for batch in self.batch_files:
+        # Submission of a file is due when the sleep times of all previous files have passed
+        self.scheduler = ArrivalScheduler()
+        offset = 0
+        for job_index, batch in enumerate(self.batch_files):
 
             last_line = os.popen("tail -n 1 %s" % batch).read()
             # if sleep time is specified
@@ -45,6 +149,8 @@ class Workload(Thread):
             else:
                 sleep_time = 0
 
+            self.scheduler.wait(offset)
+
             # Copy the batch file to the log directory
             copy_string = "cp %s %s/" % (batch, self.config.log_dir)
             copy_cmd = Command(copy_string)
@@ -71,31 +177,33 @@ class Workload(Thread):
                 user = self.config.workload.user,
                 command = 'condor_submit %s' % (self.config.workload.submit_remote))
             code = exec_cmd.execute()
+            LOG.info("%s" % (batch))
             if code == 0:
-                #LOG.info("Batch file %s has been submitted to the work queue" % (batch))
-                pass
+                self.record_arrivals(job_index, [offset])
             else:
                 LOG.error("Error occurred during submission of batch file %s" % (batch))
-
-            LOG.info("%s" % (batch))
+                self.record_failures(job_index, [offset])
 
             batch_index += 1
 
-            # Sleep for a while if this is specified in the batch file
-            time.sleep(sleep_time)
+            # The next file is due after the sleep time specified in this one (measured from its deadline,
+            # so the time spent copying and submitting does not add up)
+            offset += sleep_time
 
             # Periodic log saving, every 100 jobs
             if batch_index == 100:
                 self.scp_log_back()
                 batch_index = 0
 
-        # To give it enough time so the jobs are scheduled; unless specified otherwise
-        if sleep_time == 0:
-            time.sleep(60)
+        # Sleep time of the last file
+        self.scheduler.wait(offset)
+        return sleep_time
 
-        # After this for loop, go into monitor mode (run while there are jobs in the queue)
+    def monitor(self):
+
+        # After submitting all jobs, go into monitor mode (run while there are jobs in the queue)
         LOG.info("Workload turns into monitor mode: this thread will stop when there are no more jobs in the queue. Sleep interval: %d" % (self.interval))
-        jobs = Jobs(self.config, self.master.dns)
+        jobs = Jobs(self.config, self.master.dns, self.poller)
         count = jobs.get_current_number()
         print "Initial job count: %d" % (count)
 
@@ -124,12 +232,6 @@ class Workload(Thread):
         LOG.info("Workload completed")
 
     def scp_log_back(self):
+        """ Brings log/<experiment id>/sleep.log up to date with the log on the master (only new data is copied) """
 
-        scp_string = "scp %s@%s:~/%s %s/sleep.log" \
-                               % (self.config.workload.user, self.master.dns, self.config.workload.log_remote, self.config.log_dir)
-        scp_cmd = Command(scp_string)
-        code = scp_cmd.execute()
-        if code == 0:
-            LOG.info("Successfully obtained the log from the master node")
-        else:
-            LOG.error("Error occurred during obtaining the log from the master node")
\ No newline at end of file
+        self.log_sync.sync()
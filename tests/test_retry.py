@@ -0,0 +1,79 @@
+import time
+import unittest
+
+from lib.retry import RetryPolicy, CircuitBreaker
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_delay_grows_up_to_max_delay(self):
+        policy = RetryPolicy(initial_delay=1, max_delay=5, multiplier=2, jitter=0, max_retries=10, deadline=None)
+        delays = [policy.get_delay(retry, 0, now=0) for retry in range(1, 6)]
+        self.assertEqual(delays, [1, 2, 4, 5, 5])
+
+    def test_jitter_shortens_delay(self):
+        policy = RetryPolicy(initial_delay=4, max_delay=4, jitter=0.5, deadline=None)
+        for i in range(100):
+            delay = policy.get_delay(1, 0, now=0)
+            self.assertTrue(2 <= delay <= 4)
+
+    def test_no_delay_after_max_retries(self):
+        policy = RetryPolicy(jitter=0, max_retries=3, deadline=None)
+        self.assertNotEqual(policy.get_delay(3, 0, now=0), None)
+        self.assertEqual(policy.get_delay(4, 0, now=0), None)
+
+    def test_no_delay_past_deadline(self):
+        policy = RetryPolicy(initial_delay=2, jitter=0, deadline=10)
+        self.assertEqual(policy.get_delay(1, 100, now=107), 2)
+        self.assertEqual(policy.get_delay(1, 100, now=109), None)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker("host", failure_threshold=3, reset_timeout=60)
+        for i in range(2):
+            breaker.record_failure()
+            self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open())
+        self.assertFalse(breaker.allow())
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker("host", failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertFalse(breaker.is_open())
+        self.assertTrue(breaker.allow())
+
+    def test_single_trial_after_reset_timeout(self):
+        breaker = CircuitBreaker("host", failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        time.sleep(0.1)
+        self.assertTrue(breaker.allow())
+        # Only one trial call at a time
+        self.assertFalse(breaker.allow())
+
+    def test_trial_success_closes(self):
+        breaker = CircuitBreaker("host", failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.1)
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertFalse(breaker.is_open())
+        self.assertTrue(breaker.allow())
+        self.assertTrue(breaker.allow())
+
+    def test_trial_failure_reopens(self):
+        breaker = CircuitBreaker("host", failure_threshold=3, reset_timeout=0.05)
+        for i in range(3):
+            breaker.record_failure()
+        time.sleep(0.1)
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open())
+        self.assertFalse(breaker.allow())
+
+if __name__ == '__main__':
+    unittest.main()